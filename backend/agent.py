@@ -1,122 +1,420 @@
 import os
 import json
+import hashlib
+import re
 import base64
-import psycopg2
+import asyncio
+import time
 import datetime
+import contextvars
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.prebuilt import create_react_agent
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.tools import StructuredTool
+from psycopg2.extras import execute_values
+from db import DB_URL, db_connection
+from google_clients import get_google_service
+from sessions import DEFAULT_USER, current_user, init_session_tables
+import sessions
+from gmail import fetch_messages, parse_message
+import mail_mirror
+import calendar_store
+import compaction
+import tool_cache
+import router
+import telemetry
+import singleflight
+import response_cache
 
 
-DB_URL = os.getenv("DATABASE_URL")
-llm = ChatGoogleGenerativeAI(model="gemini-3-flash-preview", temperature=0.1)
+# Gemini client, LangGraph agent and DB schema are created on first use (or by
+# warm_up() in the FastAPI lifespan) so importing this module stays cheap.
+_llm = None
+_agent_executor = None
+_schema_ready = False
+_init_lock = threading.RLock()
 
-def get_db_connection():
-    """Establishes a connection to the PostgreSQL database."""
-    try:
-        conn = psycopg2.connect(DB_URL, sslmode='require')
-        return conn
-    except Exception as e:
-        return None
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "10"))
+MEMORY_DUMP_QUERIES = {"", "all", "*", "everything"}
+# consult_memory('all') lists facts newest first, this many per page.
+MEMORY_PAGE_SIZE = int(os.getenv("MEMORY_PAGE_SIZE", "50"))
+MEMORY_DEFAULT_NAMESPACE = "general"
+# Seconds between sweeps that delete expired facts; 0 disables the sweeper.
+MEMORY_SWEEP_INTERVAL = float(os.getenv("MEMORY_SWEEP_INTERVAL", "3600"))
+MEMORY_SWEEP_BATCH = 1000
+# Set by init_db once the pg_trgm extension and index are in place.
+memory_trigram_enabled = False
 
 def init_db():
-    """Creates the memory table if it doesn't exist."""
-    conn = get_db_connection()
-    if not conn: return
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS memory (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            );
-        """)
-        conn.commit()
-        cur.close()
-        conn.close()
-    except Exception as e:
-        print(f"Init DB Error: {e}")
+    """Creates the memory table and its retrieval indexes if they don't exist. Returns True on success."""
+    global memory_trigram_enabled
+    with db_connection() as conn:
+        if not conn: return False
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS memory (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            # Generated column: Postgres keeps it current on every save_to_memory upsert.
+            cur.execute("""
+                ALTER TABLE memory ADD COLUMN IF NOT EXISTS search tsvector
+                    GENERATED ALWAYS AS (
+                        to_tsvector('english', coalesce(key, '') || ' ' || coalesce(value, ''))
+                    ) STORED;
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS memory_search_idx ON memory USING GIN (search);")
+            # Added after the first release; existing rows get the defaults.
+            cur.execute("""
+                ALTER TABLE memory
+                    ADD COLUMN IF NOT EXISTS namespace TEXT NOT NULL DEFAULT 'general',
+                    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    ADD COLUMN IF NOT EXISTS expires_at TIMESTAMPTZ;
+            """)
+            # Facts belong to a session. Rows from the single-user days go to DEFAULT_USER.
+            cur.execute("ALTER TABLE memory ADD COLUMN IF NOT EXISTS owner TEXT NOT NULL DEFAULT %s;", (DEFAULT_USER,))
+            cur.execute("""
+                DO $$ BEGIN
+                    IF NOT EXISTS (
+                        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indrelid
+                        WHERE c.relname = 'memory' AND i.indisprimary AND i.indnatts = 2
+                    ) THEN
+                        ALTER TABLE memory DROP CONSTRAINT IF EXISTS memory_pkey;
+                        ALTER TABLE memory ADD PRIMARY KEY (owner, key);
+                    END IF;
+                END $$;
+            """)
+            cur.execute("DROP INDEX IF EXISTS memory_updated_idx, memory_namespace_idx;")
+            cur.execute("CREATE INDEX IF NOT EXISTS memory_owner_updated_idx ON memory (owner, updated_at DESC);")
+            cur.execute("CREATE INDEX IF NOT EXISTS memory_owner_namespace_idx ON memory (owner, namespace, updated_at DESC);")
+            cur.execute("CREATE INDEX IF NOT EXISTS memory_expires_idx ON memory (expires_at) WHERE expires_at IS NOT NULL;")
+            conn.commit()
+            cur.close()
+        except Exception as e:
+            print(f"Init DB Error: {e}")
+            return False
 
-if DB_URL:
-    init_db()
+        # Fuzzy matching is optional: some hosts don't allow CREATE EXTENSION.
+        try:
+            cur = conn.cursor()
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS memory_trgm_idx ON memory
+                USING GIN ((coalesce(key, '') || ' ' || coalesce(value, '')) gin_trgm_ops);
+            """)
+            conn.commit()
+            cur.close()
+            memory_trigram_enabled = True
+        except Exception as e:
+            conn.rollback()
+            print(f"Init DB Warning: trigram index unavailable ({e})")
+        return True
 
-def save_to_memory(key: str, value: str):
-    """Saves a fact to the PostgreSQL database (Persistent)."""
-    conn = get_db_connection()
-    if not conn: return "Error: Could not connect to database."
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO memory (key, value)
-            VALUES (%s, %s)
-            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value;
-        """, (key, value))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return f"Memory updated (Saved to DB): {key} -> {value}"
-    except Exception as e:
-        return f"Error saving to DB: {str(e)}"
+def ensure_schema():
+    """
+    Creates the memory and session tables once per process. If the database
+    is unreachable the flag stays unset, so the next request tries again.
+    """
+    global _schema_ready
+    if _schema_ready or not DB_URL:
+        return
+    with _init_lock:
+        if not _schema_ready:
+            # Both run even if the first fails, so a retry has less left to do.
+            memory_ready = init_db()
+            sessions_ready = init_session_tables()
+            if memory_ready and sessions_ready:
+                _start_memory_sweeper()
+                _schema_ready = True
 
-def consult_memory(query: str = "all"):
-    """Retrieves facts from the PostgreSQL database."""
-    conn = get_db_connection()
-    if not conn: return "Error: Could not connect to database."
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT key, value FROM memory")
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+def sweep_expired_memory():
+    """Deletes facts past their expires_at, in batches. Returns how many were removed."""
+    removed = 0
+    owners = set()
+    with db_connection() as conn:
+        if not conn: return 0
+        try:
+            cur = conn.cursor()
+            while True:
+                cur.execute("""
+                    DELETE FROM memory WHERE (owner, key) IN (
+                        SELECT owner, key FROM memory WHERE expires_at <= now() LIMIT %s
+                    )
+                    RETURNING owner
+                """, (MEMORY_SWEEP_BATCH,))
+                rows = cur.fetchall()
+                conn.commit()
+                removed += len(rows)
+                owners.update(row[0] for row in rows)
+                if len(rows) < MEMORY_SWEEP_BATCH:
+                    break
+            cur.close()
+        except Exception as e:
+            conn.rollback()
+            print(f"Memory sweep error: {e}")
+    # Memory is per session, so only the owners of swept facts have stale consult_memory results.
+    for owner in owners:
+        tool_cache.invalidate(owner, ("consult_memory",))
+    return removed
+
+def _memory_sweeper():
+    while True:
+        time.sleep(MEMORY_SWEEP_INTERVAL)
+        sweep_expired_memory()
+
+def _start_memory_sweeper():
+    # Reads already skip expired rows; the sweeper just keeps the table from growing.
+    if MEMORY_SWEEP_INTERVAL > 0:
+        threading.Thread(target=_memory_sweeper, name="memory-sweeper", daemon=True).start()
+
+# Write-behind for save_to_memory: an inbox scan saves facts in bursts, so they
+# are queued and upserted in one statement once MEMORY_FLUSH_SIZE keys are
+# pending or MEMORY_FLUSH_INTERVAL seconds after the first one.
+MEMORY_WRITE_BEHIND = os.getenv("MEMORY_WRITE_BEHIND", "true").lower() == "true"
+MEMORY_FLUSH_SIZE = int(os.getenv("MEMORY_FLUSH_SIZE", "100"))
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "1.0"))
+# (owner, key) -> (value, namespace, expires_at); saving a key again before the flush just replaces it.
+_pending_memory = {}
+_pending_lock = threading.Lock()
+# Flushes run one at a time so an older batch can't land after a newer one.
+_flush_lock = threading.Lock()
+_flush_timer = None
+def flush_memory():
+    """Upserts every queued fact in one statement. Returns an error string, or None."""
+    global _flush_timer
+    with _flush_lock:
+        with _pending_lock:
+            batch = dict(_pending_memory)
+            _pending_memory.clear()
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+                _flush_timer = None
+        if not batch:
+            return None
         
-        if not rows:
-            return "Memory is empty."
+        error = None
+        with db_connection() as conn:
+            if not conn:
+                error = "Error: Could not connect to database."
+            else:
+                try:
+                    cur = conn.cursor()
+                    execute_values(cur, """
+                        INSERT INTO memory (owner, key, value, namespace, expires_at, updated_at)
+                        VALUES %s
+                        ON CONFLICT (owner, key) DO UPDATE SET
+                            value = EXCLUDED.value,
+                            namespace = EXCLUDED.namespace,
+                            expires_at = EXCLUDED.expires_at,
+                            updated_at = EXCLUDED.updated_at;
+                    """, [owner_key + fact for owner_key, fact in batch.items()],
+                        template="(%s, %s, %s, %s, %s, now())", page_size=MEMORY_FLUSH_SIZE)
+                    conn.commit()
+                    cur.close()
+                except Exception as e:
+                    conn.rollback()
+                    error = f"Error saving to DB: {str(e)}"
         
-        memory_dict = {row[0]: row[1] for row in rows}
-        return f"Current Long-Term Memory: {json.dumps(memory_dict, indent=2)}"
-    except Exception as e:
-        return f"Error reading DB: {str(e)}"
+        if error:
+            # Keep the facts for the next flush, unless a newer value was queued meanwhile.
+            print(f"Memory flush failed, {len(batch)} facts re-queued: {error}")
+            with _pending_lock:
+                for owner_key, fact in batch.items():
+                    _pending_memory.setdefault(owner_key, fact)
+                _schedule_flush()
+        return error
+
+def _schedule_flush():
+    # Caller holds _pending_lock.
+    global _flush_timer
+    if _flush_timer is None:
+        _flush_timer = threading.Timer(MEMORY_FLUSH_INTERVAL, flush_memory)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+def discard_pending_memory(owner):
+    """Drops the owner's queued facts that haven't been written yet (used when their memory is wiped)."""
+    with _pending_lock:
+        for owner_key in [owner_key for owner_key in _pending_memory if owner_key[0] == owner]:
+            del _pending_memory[owner_key]
+
+def save_to_memory(key: str, value: str, namespace: str = MEMORY_DEFAULT_NAMESPACE, ttl_days: float = 0):
+    """
+    Saves a fact to the PostgreSQL database (Persistent).
+    - namespace groups related facts, e.g. 'preferences', 'projects', 'contacts'.
+    - ttl_days > 0 makes a time-sensitive fact (e.g. 'Project X delayed') expire after that many days.
+    """
+    if not DB_URL: return "Error: Could not connect to database."
+    expires_at = None
+    if ttl_days and ttl_days > 0:
+        expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=ttl_days)
+    with _pending_lock:
+        _pending_memory[(current_user(), key)] = (value, namespace.strip().lower() or MEMORY_DEFAULT_NAMESPACE, expires_at)
+        flush_now = not MEMORY_WRITE_BEHIND or len(_pending_memory) >= MEMORY_FLUSH_SIZE
+        if not flush_now:
+            _schedule_flush()
+    if not flush_now:
+        # Not written yet; consult_memory flushes the queue before it reads.
+        return f"Memory queued (written to DB within {MEMORY_FLUSH_INTERVAL:g}s): {key} -> {value}"
+    error = flush_memory()
+    if error: return error
+    return f"Memory updated (Saved to DB): {key} -> {value}"
+
+def _memory_filters(owner, namespace=None, since=None):
+    """WHERE conditions shared by every memory read: the owner's live rows, optionally one namespace / changed since."""
+    conditions = ["owner = %(owner)s", "(expires_at IS NULL OR expires_at > now())"]
+    params = {"owner": owner}
+    if namespace:
+        conditions.append("namespace = %(namespace)s")
+        params["namespace"] = namespace
+    if since is not None:
+        conditions.append("updated_at > %(since)s")
+        params["since"] = since
+    return " AND ".join(conditions), params
+
+def all_memory(cur, owner, namespace=None, since=None, limit=MEMORY_PAGE_SIZE, offset=0):
+    """Returns one page of the owner's (key, value) rows plus the total number of matching rows, newest first."""
+    where, params = _memory_filters(owner, namespace, since)
+    cur.execute(f"""
+        SELECT key, value, count(*) OVER () FROM memory
+        WHERE {where}
+        ORDER BY updated_at DESC, key
+        LIMIT %(limit)s OFFSET %(offset)s
+    """, dict(params, limit=limit, offset=offset))
+    rows = cur.fetchall()
+    total = rows[0][2] if rows else 0
+    return [(key, value) for key, value, _ in rows], total
+
+def search_memory(cur, owner, query: str, limit: int = MEMORY_TOP_K, namespace=None, since=None):
+    """Returns the owner's (key, value) rows most relevant to the query, best first."""
+    # OR the query terms together so a question only needs to share some words with a fact.
+    ts_query = "replace(plainto_tsquery('english', %(q)s)::text, '&', '|')::tsquery"
+    document = "(coalesce(key, '') || ' ' || coalesce(value, ''))"
+    where, params = _memory_filters(owner, namespace, since)
+    params.update(q=query, k=limit)
+    if memory_trigram_enabled:
+        cur.execute(f"""
+            SELECT key, value FROM memory
+            WHERE (search @@ {ts_query} OR %(q)s <%% {document}) AND {where}
+            ORDER BY ts_rank(search, {ts_query}) DESC,
+                     word_similarity(%(q)s, {document}) DESC
+            LIMIT %(k)s
+        """, params)
+    else:
+        cur.execute(f"""
+            SELECT key, value FROM memory
+            WHERE search @@ {ts_query} AND {where}
+            ORDER BY ts_rank(search, {ts_query}) DESC
+            LIMIT %(k)s
+        """, params)
+    return cur.fetchall()
+
+def consult_memory(query: str = "all", namespace: str = "", changed_since: str = "", page: int = 1):
+    """
+    Retrieves facts from the PostgreSQL database.
+    - Pass keywords (e.g. 'meeting preferences', 'Project X') to get the most relevant facts.
+    - Pass 'all' to list stored facts, newest first, one page at a time (use this for "What do you know about me?").
+    - namespace limits the lookup to one group of facts (e.g. 'projects').
+    - changed_since (ISO date/time, e.g. '2026-01-20') returns only facts saved or updated after it.
+    - page selects later pages of an 'all' listing.
+    """
+    since = None
+    if changed_since:
+        try:
+            since = datetime.datetime.fromisoformat(changed_since.replace('Z', '+00:00'))
+        except ValueError:
+            return f"Error: changed_since must be an ISO date/time like '2026-01-20', got '{changed_since}'."
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+    namespace = namespace.strip().lower() or None
+    page = max(int(page or 1), 1)
+    
+    flush_memory() # Reads must see facts saved earlier in this turn.
+    with db_connection() as conn:
+        if not conn: return "Error: Could not connect to database."
+        try:
+            cur = conn.cursor()
+            dump_all = query.strip().lower() in MEMORY_DUMP_QUERIES
+            if dump_all:
+                rows, total = all_memory(cur, current_user(), namespace, since, offset=(page - 1) * MEMORY_PAGE_SIZE)
+            else:
+                rows = search_memory(cur, current_user(), query, namespace=namespace, since=since)
+            cur.close()
+
+            if not rows:
+                if dump_all:
+                    return "Memory is empty." if page == 1 else f"No facts on page {page}."
+                return f"No stored facts matched '{query}'. Call consult_memory('all') to see everything."
+
+            memory_dict = {row[0]: row[1] for row in rows}
+            if dump_all:
+                pages = -(-total // MEMORY_PAGE_SIZE)
+                more = f" Call consult_memory('all', page={page + 1}) for more." if page < pages else ""
+                return f"Current Long-Term Memory (page {page} of {pages}, {total} facts):{more} {json.dumps(memory_dict, indent=2)}"
+            return f"Relevant Long-Term Memory (top {len(rows)} for '{query}'): {json.dumps(memory_dict, indent=2)}"
+        except Exception as e:
+            return f"Error reading DB: {str(e)}"
 
 def clear_memory():
-    """Wipes the database memory AND the chat history."""
-    global chat_history
-    chat_history = [] 
+    """Wipes this user's database memory AND chat history."""
+    turn = _active_turn.get()
+    if turn is not None:
+        turn["cleared"] = True # Don't save the in-flight turn over the wiped history.
+    sessions.clear_conversation(current_user())
     
-    conn = get_db_connection()
-    if not conn: return "Error: Could not connect to database."
-    try:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM memory")
-        conn.commit()
-        cur.close()
-        conn.close()
-        return "Memory and Chat History have been wiped."
-    except Exception as e:
-        return f"Error wiping DB: {str(e)}"
+    # Holding the flush lock keeps a batch already on its way from landing after the DELETE.
+    with _flush_lock, db_connection() as conn:
+        discard_pending_memory(current_user())
+        if not conn: return "Error: Could not connect to database."
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM memory WHERE owner = %s", (current_user(),))
+            conn.commit()
+            cur.close()
+            return "Memory and Chat History have been wiped."
+        except Exception as e:
+            return f"Error wiping DB: {str(e)}"
     
 
+def _sync_calendar(service, user):
+    # calendar_store.sync already coalesces through its per-user lock and
+    # CALENDAR_SYNC_INTERVAL; single-flight only matters when every waiter is
+    # due a sync (interval 0 or just expired), where they'd otherwise each
+    # run one back to back behind the lock.
+    singleflight.do(("calendar_sync", user), lambda: calendar_store.sync(service, user))
+    _note_read_version("calendar", calendar_store.version(user))
+
+def _sync_mailbox(service, user):
+    singleflight.do(("mailbox_sync", user), lambda: mail_mirror.sync(service, user))
+    _note_read_version("mailbox", mail_mirror.version(user))
+
+def _note_read_version(source, version):
+    """Records, for the response cache, the version of a source a tool in the active turn is about to read."""
+    turn = _active_turn.get()
+    if turn is not None:
+        turn.setdefault("read_versions", {})[source] = version
+
 def list_events():
     """Lists the next 10 upcoming calendar events with durations."""
     try:
         service = get_google_service('calendar', 'v3')
         if not service: return "Error: Login required."
         
-        now = (datetime.datetime.utcnow() - datetime.timedelta(days=1)).isoformat() + 'Z'
-        
-        events_result = service.events().list(calendarId='primary', timeMin=now,
-                                              maxResults=10, singleEvents=True,
-                                              orderBy='startTime').execute()
-        events = events_result.get('items', [])
+        _sync_calendar(service, current_user())
+        now = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)
+        events = calendar_store.upcoming(current_user(), now, limit=10)
         if not events: return "No upcoming events found."
         
         event_list = []
         for event in events:
             start = event['start'].get('dateTime', event['start'].get('date'))
             end = event['end'].get('dateTime', event['end'].get('date'))
-            summary = event['summary']
+            summary = event.get('summary', 'Busy')
             
             event_list.append(f"Event: {summary} | Start: {start} | End: {end}")
             
@@ -139,6 +437,7 @@ def schedule_event(summary: str, start_time: str, end_time: str):
             'end': {'dateTime': end_time, 'timeZone': 'Asia/Kolkata'},
         }
         event = service.events().insert(calendarId='primary', body=event).execute()
+        calendar_store.apply_upsert(current_user(), event)
         
         return f"SUCCESS: Event created: {event.get('htmlLink')}. IMPORTANT: Call 'save_to_memory' now to record this meeting in your long-term database."
     except Exception as e:
@@ -153,12 +452,15 @@ def delete_event(event_title: str):
         service = get_google_service('calendar', 'v3')
         if not service: return "Error: Login required."
         
-        # 1. Find the event first
-        now = datetime.datetime.utcnow().isoformat() + 'Z'
-        events_result = service.events().list(calendarId='primary', timeMin=now,
-                                              q=event_title, # Search query
-                                              maxResults=5, singleEvents=True).execute()
-        events = events_result.get('items', [])
+        # 1. Find the event first (locally, then Google's free-text search as a fallback)
+        _sync_calendar(service, current_user())
+        now = datetime.datetime.now(datetime.timezone.utc)
+        events = calendar_store.upcoming(current_user(), now, limit=5, title=event_title)
+        if not events:
+            events_result = service.events().list(calendarId='primary', timeMin=now.isoformat(),
+                                                  q=event_title, # Search query
+                                                  maxResults=5, singleEvents=True).execute()
+            events = events_result.get('items', [])
         
         if not events:
             return f"Error: Could not find any upcoming event with title '{event_title}' to delete."
@@ -166,26 +468,42 @@ def delete_event(event_title: str):
         # 2. Delete the first matching event
         target_event = events[0]
         service.events().delete(calendarId='primary', eventId=target_event['id']).execute()
+        calendar_store.apply_delete(current_user(), target_event['id'])
         
-        return f"SUCCESS: Deleted event '{target_event['summary']}'."
+        return f"SUCCESS: Deleted event '{target_event.get('summary', 'Busy')}'."
     except Exception as e:
         return f"Error deleting event: {str(e)}"
 
 
-def get_google_service(service_name, version):
-    if not os.path.exists("token.json"):
-        return None
-    with open("token.json", "r") as f:
-        creds_data = json.load(f)
-    creds = Credentials(
-        token=creds_data["token"],
-        refresh_token=creds_data["refresh_token"],
-        token_uri=creds_data["token_uri"],
-        client_id=creds_data["client_id"],
-        client_secret=creds_data["client_secret"],
-        scopes=creds_data["scopes"]
+# Gmail search operators (from:, -label, OR, quoted phrases) need Gmail's own search.
+GMAIL_OPERATOR_PATTERN = re.compile(r'\w+:|(^|\s)-\w|\bOR\b|[{}()"]')
+
+def _format_emails(rows):
+    return "\n".join(
+        f"email_id: {email_id}\nFROM: {sender}\nSUBJECT: {subject}\nBODY: {body[:2000]}\n---"
+        for email_id, sender, subject, body in rows
     )
-    return build(service_name, version, credentials=creds)
+
+def _read_emails_live(service, search_term):
+    if search_term == "latest":
+        # UPDATED: Fetch 10 to ensure we have enough valid ones after filtering
+        results = service.users().messages().list(userId='me', maxResults=10).execute()
+    else:
+        results = service.users().messages().list(userId='me', q=search_term, maxResults=10).execute()
+        
+    messages = results.get('messages', [])
+    
+    # One batch round trip instead of up to 10 sequential messages.get calls.
+    fetched, _ = fetch_messages(service, [msg['id'] for msg in messages]) if messages else ([], [])
+    
+    rows = []
+    for txt in fetched:
+        sender, subject, body = parse_message(txt)
+        if body is None:
+            continue
+        rows.append((txt['id'], sender, subject, body))
+        if len(rows) >= 5: break # Stop once we have 5 good emails
+    return rows
 
 def read_emails(search_term: str = "latest"):
     """
@@ -196,47 +514,22 @@ def read_emails(search_term: str = "latest"):
         service = get_google_service('gmail', 'v1')
         if not service: return "Error: No login token found. Please login first."
         
-        if search_term == "latest":
-            # UPDATED: Fetch 10 to ensure we have enough valid ones after filtering
-            results = service.users().messages().list(userId='me', maxResults=10).execute()
-        else:
-            results = service.users().messages().list(userId='me', q=search_term, maxResults=10).execute()
-            
-        messages = results.get('messages', [])
-        if not messages: return "No emails found."
+        rows = []
+        if not GMAIL_OPERATOR_PATTERN.search(search_term):
+            # Served from the local mirror; only new history is fetched from Gmail.
+            try:
+                _sync_mailbox(service, current_user())
+                rows = mail_mirror.search(current_user(), search_term)
+            except Exception as e:
+                print(f"Mailbox mirror error: {e}")
         
-        email_data = []
-        count = 0 # NEW: Counter to ensure we stop exactly at 5
+        # Older mail outside the mirror, operator queries, or a failed sync.
+        if not rows:
+            rows = singleflight.do(("gmail_search", current_user(), search_term),
+                                   lambda: _read_emails_live(service, search_term))
+        if not rows: return "No emails found."
         
-        for msg in messages:
-            if count >= 5: break # Stop once we have 5 good emails
-            
-            txt = service.users().messages().get(userId='me', id=msg['id']).execute()
-            payload = txt.get('payload', {})
-            headers = payload.get('headers', [])
-            
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-            sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
-            
-            body = "No Body Found"
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    if part['mimeType'] == 'text/plain':
-                        data = part['body'].get('data')
-                        if data:
-                            body = base64.urlsafe_b64decode(data).decode()
-                        break
-            elif 'body' in payload:
-                data = payload['body'].get('data')
-                if data:
-                    body = base64.urlsafe_b64decode(data).decode()
-
-            if body != "No Body Found":
-                count += 1 # Only increment if we actually found content
-                clean_body = body[:2000] 
-                email_data.append(f"email_id: {msg['id']}\nFROM: {sender}\nSUBJECT: {subject}\nBODY: {clean_body}\n---")
-            
-        return "\n".join(email_data)
+        return _format_emails(rows)
     except Exception as e:
         return f"Error reading emails: {str(e)}"
     
@@ -263,9 +556,141 @@ def send_email(to: str, subject: str, body: str):
     except Exception as e:
         return f"Error sending email: {str(e)}"
 
-tools = [read_emails, send_email, list_events, schedule_event, delete_event, save_to_memory, consult_memory, clear_memory]
+# Blocking Google/Postgres I/O runs here, off the event loop and outside
+# uvicorn's request threadpool, so concurrent chats don't queue behind it.
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "16"))
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a blocking helper on the tool executor and awaits its result."""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (current session, active turn) into the worker thread.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(tool_executor, functools.partial(context.run, func, *args, **kwargs))
+
+# Tools with side effects run one at a time, in the order the model asked for
+# them; everything else in a step runs concurrently on the tool executor.
+SIDE_EFFECT_TOOLS = {"send_email", "schedule_event", "delete_event", "clear_memory"}
+# Read tools give up after this long. Side-effect tools have no timeout: the
+# worker thread can't be stopped, so a "timed out" write may still land, and
+# reporting it as failed invites the model to send the email twice.
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+TOOL_TIMEOUTS = {"read_emails": float(os.getenv("TOOL_TIMEOUT_READ_EMAILS", "60"))}
+
+def as_async_tool(func):
+    """Exposes a blocking tool function with both sync and async entry points."""
+    name = func.__name__
+    timeout = None if name in SIDE_EFFECT_TOOLS else TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT)
+
+    async def coroutine(**kwargs):
+        try:
+            return await asyncio.wait_for(run_blocking(func, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            return f"Error: {name} timed out after {timeout:.0f} seconds."
 
-agent_executor = create_react_agent(llm, tools)
+    return StructuredTool.from_function(func=func, coroutine=coroutine)
+
+# tool_call_id -> Event set once that side-effect call has finished, for the
+# call listed after it in the same model step to wait on.
+_side_effects_done = {}
+_side_effects_lock = threading.Lock()
+
+def _side_effect_slot(request):
+    """Returns (id of the side-effect call listed just before this one, whether one is listed after it)."""
+    call_id = request.tool_call["id"]
+    state = request.state
+    messages = state.get("messages", []) if isinstance(state, dict) else state
+    for message in reversed(messages):
+        ids = [call["id"] for call in getattr(message, "tool_calls", None) or [] if call["name"] in SIDE_EFFECT_TOOLS]
+        if call_id in ids:
+            index = ids.index(call_id)
+            return (ids[index - 1] if index else None), index < len(ids) - 1
+    return None, False
+
+def _done_event(call_id, factory):
+    with _side_effects_lock:
+        return _side_effects_done.setdefault(call_id, factory())
+
+def _forget_done_event(call_id):
+    with _side_effects_lock:
+        _side_effects_done.pop(call_id, None)
+
+def _sequence_tool_call(request, execute):
+    """ToolNode wrapper for the sync path: side-effect calls run strictly in listed order."""
+    if request.tool_call["name"] not in SIDE_EFFECT_TOOLS:
+        return execute(request)
+    previous, followed = _side_effect_slot(request)
+    if previous is not None:
+        _done_event(previous, threading.Event).wait()
+        _forget_done_event(previous)
+    try:
+        return execute(request)
+    finally:
+        if followed:
+            _done_event(request.tool_call["id"], threading.Event).set()
+
+async def _asequence_tool_call(request, execute):
+    """Async counterpart of _sequence_tool_call; read-only calls still run concurrently."""
+    if request.tool_call["name"] not in SIDE_EFFECT_TOOLS:
+        return await execute(request)
+    previous, followed = _side_effect_slot(request)
+    if previous is not None:
+        await _done_event(previous, asyncio.Event).wait()
+        _forget_done_event(previous)
+    try:
+        return await execute(request)
+    finally:
+        if followed:
+            _done_event(request.tool_call["id"], asyncio.Event).set()
+
+def tool_node():
+    """The agent's tool-running step: ToolNode starts every call at once; the wrappers order the side effects."""
+    from langgraph.prebuilt import ToolNode
+    return ToolNode(tools, wrap_tool_call=_sequence_tool_call, awrap_tool_call=_asequence_tool_call)
+
+def _build_agent(model):
+    from langgraph.prebuilt import create_react_agent
+    return create_react_agent(model, tool_node())
+
+# Read-only tools are memoized per session; write tools invalidate what they change.
+tools = [as_async_tool(telemetry.traced_tool(tool_cache.cached(func))) for func in
+         [read_emails, send_email, list_events, schedule_event, delete_event, save_to_memory, consult_memory, clear_memory]]
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _init_lock:
+            if _llm is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                _llm = ChatGoogleGenerativeAI(model="gemini-3-flash-preview", temperature=0.1)
+    return _llm
+
+def get_agent_executor():
+    global _agent_executor
+    if _agent_executor is None:
+        with _init_lock:
+            if _agent_executor is None:
+                ensure_schema()
+                _agent_executor = _build_agent(get_llm())
+    return _agent_executor
+
+def set_llm(model):
+    """Swaps in a different chat model (e.g. a scripted fake for benchmarks)."""
+    global _llm, _agent_executor
+    with _init_lock:
+        _llm = model
+        _agent_executor = _build_agent(model)
+
+def warm_up():
+    """Builds everything the first chat needs; run in the background at startup."""
+    ensure_schema()
+    get_agent_executor()
+
+def readiness():
+    return {
+        "database": _schema_ready or not DB_URL,
+        "agent": _agent_executor is not None,
+    }
 
 BASE_SYSTEM_PROMPT = """You are an elite Personal Agentic Assistant that acts as a Chief of Staff, your name is Sentient.
 Your Goal: Manage the user's life by connecting data points, but NEVER compromise accuracy or safety.
@@ -278,7 +703,8 @@ CORE RULES:
 
 1. **PASSIVE MEMORY (CRITICAL):** - When you use 'read_emails', you must ACTIVELY look for new facts (e.g., "Project X is delayed", "New deadline is Friday").
    - If you find a new fact, **IMMEDIATELY call 'save_to_memory'** to store it. Do not ask for permission. Just save it.
-   - Example: If email says "Project X delayed", call `save_to_memory("Project X Status", "Delayed by 2 weeks")`.
+   - Example: If email says "Project X delayed", call `save_to_memory("Project X Status", "Delayed by 2 weeks", namespace="projects", ttl_days=30)`.
+   - Use a short namespace (e.g. 'preferences', 'projects', 'contacts') and set ttl_days for facts that go stale; leave it 0 for lasting facts.
 
 2. **MEMORY FIRST:** - Always check memory using 'consult_memory' before acting.
 
@@ -317,10 +743,36 @@ You have permission to send emails, prefer verification for important messages.
 You have permission to update memory autonomously. 
 You have permission to manage and update calendar autonomously. """
 
-chat_history = []
+# Conversation state of the turn running in this context (see _start_turn).
+_active_turn = contextvars.ContextVar("active_turn", default=None)
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and their assistant.
+Keep every fact, decision, commitment, email address and date that could matter later; drop small talk.
+Reply with the updated summary only, as short bullet points.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW MESSAGES TO FOLD IN:
+{transcript}"""
+
+def _summarize(summary, messages):
+    """Folds compacted-away messages into the running summary."""
+    transcript = "\n".join(f"{m.type.upper()}: {_flatten_content(m.content)[:1000]}" for m in messages)
+    try:
+        result = get_llm().invoke(SUMMARY_PROMPT.format(summary=summary or "(empty)", transcript=transcript),
+                            config=telemetry.llm_config())
+        return _flatten_content(result.content).strip()
+    except Exception as e:
+        print(f"Summary Error: {e}")
+        # Keep the gist rather than losing the turns entirely.
+        return (summary + "\n" + transcript[:2000]).strip()
 
-def run_agent(user_input: str):
-    global chat_history
+def _start_turn(session_id, user_input: str):
+    """Loads the session's conversation, refreshes the system prompt's clock and appends the user's message."""
+    turn = sessions.load_conversation(session_id)
+    turn["cleared"] = False
+    chat_history = turn["messages"]
     
     utc_now = datetime.datetime.utcnow()
     ist_now = utc_now + datetime.timedelta(hours=5, minutes=30)
@@ -328,6 +780,8 @@ def run_agent(user_input: str):
     formatted_time = ist_now.strftime("%A, %Y-%m-%d %H:%M:%S IST")
     
     current_system_prompt = BASE_SYSTEM_PROMPT.format(current_time=formatted_time)
+    if turn["summary"]:
+        current_system_prompt += f"\n\nSUMMARY OF EARLIER CONVERSATION:\n{turn['summary']}"
     
     if not chat_history:
         chat_history.append(SystemMessage(content=current_system_prompt))
@@ -335,12 +789,49 @@ def run_agent(user_input: str):
         chat_history[0] = SystemMessage(content=current_system_prompt)
     
     chat_history.append(HumanMessage(content=user_input))
-    
-    response = agent_executor.invoke({"messages": chat_history})
-    agent_output = response["messages"][-1]
-    chat_history.append(agent_output)
-    
-    content = agent_output.content
+    return turn
+
+def _finish_turn(session_id, turn, response_messages):
+    """
+    Keeps the turn's messages (tool calls included) and saves the session.
+    Old tool outputs are stubbed right away; if the history is still over the
+    token budget, folding old turns into the summary (a Gemini call) runs in
+    the background so the user's reply isn't held up by it.
+    """
+    if turn["cleared"]:
+        return # clear_memory wiped the conversation during this turn.
+    messages = list(response_messages)
+    # Where this turn's own messages (the user's message onwards) start.
+    own = len(turn["messages"]) - 1
+    summary, expected = turn["summary"], turn["version"]
+    for _ in range(5):
+        chat_history, summary = compaction.compact(messages, summary, None)
+        version = sessions.save_conversation(session_id, chat_history, summary, expected_version=expected)
+        if version is not None:
+            break
+        # Saved by someone else since the turn started (usually the background
+        # summarizer): put this turn on top of that history instead of overwriting it.
+        latest = sessions.load_conversation(session_id)
+        messages = latest["messages"] + messages[own:]
+        own, summary, expected = len(latest["messages"]), latest["summary"], latest["version"]
+    else:
+        version = sessions.save_conversation(session_id, chat_history, summary)
+    if compaction.total_tokens(chat_history) > compaction.CHAT_TOKEN_BUDGET:
+        tool_executor.submit(contextvars.copy_context().run, _summarize_later, session_id, version)
+
+def _summarize_later(session_id, version):
+    """Compacts a saved conversation, unless a newer turn has been saved in the meantime."""
+    try:
+        turn = sessions.load_conversation(session_id)
+        if turn["version"] != version:
+            return # The newer turn schedules its own compaction.
+        chat_history, summary = compaction.compact(turn["messages"], turn["summary"], _summarize)
+        sessions.save_conversation(session_id, chat_history, summary, expected_version=version)
+    except Exception as e:
+        print(f"Background compaction error: {e}")
+
+def _flatten_content(content):
+    """Gemini may return a list of content blocks; join their text parts."""
     if isinstance(content, list):
         final_text = ""
         for block in content:
@@ -349,49 +840,370 @@ def run_agent(user_input: str):
         return final_text
     return str(content)
 
+def _answer_next_event():
+    service = get_google_service('calendar', 'v3')
+    if not service: return None # Let the agent explain the login requirement.
+    _sync_calendar(service, current_user())
+    now = datetime.datetime.now(datetime.timezone.utc)
+    # Same events the dashboard shows, minus the one already under way.
+    for event in calendar_store.upcoming(current_user(), now, limit=None):
+        start = calendar_store.parse_event_time(event['start'])
+        if start > now and _is_dashboard_event(event):
+            break
+    else:
+        return "You have no upcoming events."
+    when = start.strftime("%A, %b %d") if 'date' in event['start'] else start.strftime("%A, %b %d at %I:%M %p")
+    return f"Your next event is **{event.get('summary', 'Busy')}** on {when}."
+
+def _answer_memory_dump():
+    flush_memory()
+    with db_connection() as conn:
+        if not conn: return None
+        cur = conn.cursor()
+        rows, total = all_memory(cur, current_user())
+        cur.close()
+    if not rows:
+        return "I don't have any stored information about you yet."
+    answer = "Here's what I know about you:\n" + "\n".join(f"- **{key}:** {value}" for key, value in rows)
+    if total > len(rows):
+        answer += f"\n\n...and {total - len(rows)} older facts."
+    return answer
+
+def _answer_latest_emails():
+    service = get_google_service('gmail', 'v1')
+    if not service: return None
+    _sync_mailbox(service, current_user())
+    rows = mail_mirror.search(current_user(), "latest")
+    if not rows:
+        return None
+    lines = ["Here are your latest emails:"]
+    for i, (email_id, sender, subject, body) in enumerate(rows, start=1):
+        preview = " ".join(body.split())[:160]
+        lines.append(f"{i}. **{subject}** from {sender}\n   {preview}")
+    return "\n".join(lines)
 
-def get_upcoming_events_list():
-    """Helper: Gets the next 10 upcoming events, filtering out birthdays/holidays."""
+FAST_PATH_ANSWERS = {
+    "next_event": _answer_next_event,
+    "memory_dump": _answer_memory_dump,
+    "latest_emails": _answer_latest_emails,
+}
+
+def _fast_path(session_id, user_input: str):
+    """
+    Answers simple, unambiguous requests (see router.py) from a template
+    without calling Gemini. Returns None to fall back to the full agent.
+    """
+    # First DB touch of every turn, so make sure the tables exist even if warm-up hasn't finished.
+    ensure_schema()
+    intent = router.classify(user_input)
+    if intent is None:
+        return None
     try:
-        service = get_google_service('calendar', 'v3')
-        if not service: return []
+        answer = FAST_PATH_ANSWERS[intent]()
+    except Exception as e:
+        print(f"Fast path error ({intent}): {e}")
+        return None
+    if answer is None:
+        return None
+    # Record the exchange so follow-up questions have the context.
+    turn = _start_turn(session_id, user_input)
+    _finish_turn(session_id, turn, turn["messages"] + [AIMessage(content=answer)])
+    return answer
+
+# The data an agent answer can depend on, by the read tool that consults it.
+# A cached answer is only reused while the sources its turn read are unchanged.
+RESPONSE_SOURCES = {"list_events": "calendar", "read_emails": "mailbox", "consult_memory": "memory"}
+
+def _memory_version(user):
+    """(live facts, latest update) for the user's memory; changes whenever their facts do, in any worker."""
+    flush_memory()
+    with db_connection() as conn:
+        if not conn: return None
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT count(*), max(updated_at) FROM memory
+            WHERE owner = %s AND (expires_at IS NULL OR expires_at > now())
+        """, (user,))
+        count, updated_at = cur.fetchone()
+        cur.close()
+    return count, updated_at.isoformat() if updated_at else None
+
+# Another worker's save_to_memory/clear_memory can't reach this process's
+# tool cache, so cached consult_memory results are checked against the table.
+tool_cache.track_version("consult_memory", _memory_version)
+
+def _source_version(user, source, sync):
+    if source == "memory":
+        return _memory_version(user)
+    store, sync_source, api = {
+        "calendar": (calendar_store, _sync_calendar, ('calendar', 'v3')),
+        "mailbox": (mail_mirror, _sync_mailbox, ('gmail', 'v1')),
+    }[source]
+    if sync:
+        service = get_google_service(*api, user)
+        if service:
+            sync_source(service, user)
+    return store.version(user)
+
+def _data_stamps(user, sources, sync):
+    """
+    ((source, version), ...) for the given sources, or None if one can't be
+    read. With sync, calendar and mailbox are brought up to date first (free
+    within their sync interval); without, the local copies' versions are read.
+    """
+    try:
+        return tuple((source, _source_version(user, source, sync)) for source in sorted(sources))
+    except Exception as e:
+        print(f"Response cache stamp error: {e}")
+        return None
+
+def _cached_answer(session_id, user_input: str):
+    """
+    Returns (answer, versions). The answer is a cached reply to the same
+    standalone question over unchanged data, or None; versions are the data
+    stamps read before the turn, which a fresh answer gets cached under.
+    Follow-ups ("send it to him") never get here: cacheable() turns them away.
+    """
+    if not response_cache.cacheable(user_input):
+        return None, None
+    answer = response_cache.get(session_id, user_input,
+                                lambda sources: _data_stamps(session_id, sources, sync=True))
+    if answer is not None:
+        turn = _start_turn(session_id, user_input)
+        _finish_turn(session_id, turn, turn["messages"] + [AIMessage(content=answer)])
+        return answer, None
+    # Read before the turn, unsynced; _cache_answer prefers the versions the
+    # turn's tools saw after syncing (see _note_read_version).
+    return None, dict(_data_stamps(session_id, set(RESPONSE_SOURCES.values()), sync=False) or ())
+
+def _cache_answer(session_id, user_input: str, versions, turn, response_messages, answer, cost):
+    """Caches an agent answer unless the turn changed something (write tools, a wiped conversation)."""
+    if versions is None or turn["cleared"]:
+        return
+    sources = set()
+    for message in response_messages[len(turn["messages"]):]:
+        for call in getattr(message, "tool_calls", None) or []:
+            if call["name"] in tool_cache.INVALIDATES:
+                return
+            if call["name"] in RESPONSE_SOURCES:
+                sources.add(RESPONSE_SOURCES[call["name"]])
+    # What the tools actually read beats the pre-turn snapshot: a turn's own
+    # sync (a cold store, say) would otherwise leave the entry stale at once.
+    versions = {**versions, **turn.get("read_versions", {})}
+    if not sources <= versions.keys():
+        return # A source's version couldn't be read before the turn.
+    sources = tuple(sorted(sources))
+    response_cache.put(session_id, user_input, sources,
+                       tuple((source, versions[source]) for source in sources), answer, cost)
+
+def run_agent(user_input: str, session_id: str = DEFAULT_USER):
+    user_token = sessions.set_current_user(session_id)
+    try:
+        answer = _fast_path(session_id, user_input)
+        if answer is not None:
+            return answer
+        answer, versions = _cached_answer(session_id, user_input)
+        if answer is not None:
+            return answer
+        turn = _start_turn(session_id, user_input)
+        turn_token = _active_turn.set(turn)
+        try:
+            started = time.perf_counter()
+            response = get_agent_executor().invoke({"messages": turn["messages"]}, config=telemetry.llm_config())
+            agent_output = response["messages"][-1]
+            _finish_turn(session_id, turn, response["messages"])
+            _cache_answer(session_id, user_input, versions, turn, response["messages"],
+                          _flatten_content(agent_output.content), time.perf_counter() - started)
+        finally:
+            _active_turn.reset(turn_token)
+    finally:
+        sessions.reset_current_user(user_token)
+    
+    return _flatten_content(agent_output.content)
+
+async def arun_agent(user_input: str, session_id: str = DEFAULT_USER):
+    """Async variant of run_agent used by the FastAPI endpoints."""
+    user_token = sessions.set_current_user(session_id)
+    try:
+        answer = await run_blocking(_fast_path, session_id, user_input)
+        if answer is not None:
+            return answer
+        answer, versions = await run_blocking(_cached_answer, session_id, user_input)
+        if answer is not None:
+            return answer
+        turn = await run_blocking(_start_turn, session_id, user_input)
+        turn_token = _active_turn.set(turn)
+        try:
+            started = time.perf_counter()
+            executor = await run_blocking(get_agent_executor)
+            response = await executor.ainvoke({"messages": turn["messages"]}, config=telemetry.llm_config())
+            agent_output = response["messages"][-1]
+            # Summarizing may call the LLM, so keep it off the event loop.
+            await run_blocking(_finish_turn, session_id, turn, response["messages"])
+            _cache_answer(session_id, user_input, versions, turn, response["messages"],
+                          _flatten_content(agent_output.content), time.perf_counter() - started)
+        finally:
+            _active_turn.reset(turn_token)
+    finally:
+        sessions.reset_current_user(user_token)
+    
+    return _flatten_content(agent_output.content)
+
+
+DASHBOARD_IGNORED_KEYWORDS = ["birthday", "holiday", "anniversary"]
+
+def _is_dashboard_event(event):
+    """False for birthdays, holidays and the like, which the dashboard and quick answers skip."""
+    summary = event.get('summary', 'Busy').lower()
+    return not any(keyword in summary for keyword in DASHBOARD_IGNORED_KEYWORDS)
+
+def _format_dashboard(events):
+    """Turns store events into the dashboard's [{title, time}] list, filtering out birthdays/holidays."""
+    if not events: return []
+    
+    dashboard_data = []
+
+    for event in events:
+        summary = event.get('summary', 'Busy')
         
-        now = datetime.datetime.utcnow().isoformat() + 'Z'
+        if not _is_dashboard_event(event):
+            continue
+
+        start = event['start'].get('dateTime', event['start'].get('date'))
         
-        events_result = service.events().list(calendarId='primary', timeMin=now,
-                                              maxResults=10, singleEvents=True,
-                                              orderBy='startTime').execute()
-        events = events_result.get('items', [])
+        formatted_time = start
+        try:
+            if 'T' in start:
+                dt_obj = datetime.datetime.fromisoformat(start)
+                formatted_time = dt_obj.strftime("%I:%M %p") 
+            else:
+                dt_obj = datetime.datetime.strptime(start, "%Y-%m-%d")
+                formatted_time = dt_obj.strftime("%b %d")
+        except:
+            pass
         
-        if not events: return []
+        dashboard_data.append({"title": summary, "time": formatted_time})
         
-        dashboard_data = []
-        ignored_keywords = ["birthday", "holiday", "anniversary"]
+        if len(dashboard_data) >= 10:
+            break
 
-        for event in events:
-            summary = event.get('summary', 'Busy')
-            
-            if any(keyword in summary.lower() for keyword in ignored_keywords):
-                continue
+    return dashboard_data
 
-            start = event['start'].get('dateTime', event['start'].get('date'))
-            
-            formatted_time = start
-            try:
-                if 'T' in start:
-                    dt_obj = datetime.datetime.fromisoformat(start)
-                    formatted_time = dt_obj.strftime("%I:%M %p") 
-                else:
-                    dt_obj = datetime.datetime.strptime(start, "%Y-%m-%d")
-                    formatted_time = dt_obj.strftime("%b %d")
-            except:
-                pass
-            
-            dashboard_data.append({"title": summary, "time": formatted_time})
-            
-            if len(dashboard_data) >= 10:
-                break
-
-        return dashboard_data
+def get_upcoming_events_list(user=None):
+    """Helper: Gets the next 10 upcoming events, filtering out birthdays/holidays."""
+    user = user or current_user()
+    try:
+        service = get_google_service('calendar', 'v3', user)
+        if not service: return []
+        
+        # Served from the shared calendar store: dashboard polling within the
+        # sync interval costs no Calendar API requests.
+        _sync_calendar(service, user)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return _format_dashboard(calendar_store.upcoming(user, now, limit=10))
     except Exception:
-        return []
\ No newline at end of file
+        return []
+
+# Users whose last dashboard is kept, least recently used evicted first.
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "256"))
+# user -> {"version", "valid_until", "body", "etag"}: the last serialized dashboard.
+_dashboards = OrderedDict()
+_dashboards_lock = threading.Lock()
+_NEVER = datetime.datetime.max.replace(tzinfo=datetime.timezone.utc)
+
+def _dashboard_entry(data, version=None, valid_until=_NEVER):
+    body = json.dumps(data, separators=(',', ':')).encode()
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    return {"version": version, "valid_until": valid_until, "body": body, "etag": etag}
+
+_EMPTY_DASHBOARD = _dashboard_entry([])
+
+def get_dashboard(user=None):
+    """
+    Returns (body, etag) for /next-event: the dashboard list as JSON bytes and
+    a strong ETag of them. The serialized list is reused while the calendar
+    store is unchanged and until the first listed event ends.
+    """
+    user = user or current_user()
+    try:
+        service = get_google_service('calendar', 'v3', user)
+        if not service: return _EMPTY_DASHBOARD["body"], _EMPTY_DASHBOARD["etag"]
+        _sync_calendar(service, user)
+    except Exception as e:
+        print(f"Dashboard sync error: {e}")
+        return _EMPTY_DASHBOARD["body"], _EMPTY_DASHBOARD["etag"]
+    
+    version = calendar_store.version(user)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with _dashboards_lock:
+        entry = _dashboards.get(user)
+        if entry is not None:
+            _dashboards.move_to_end(user)
+    if entry is None or entry["version"] != version or now >= entry["valid_until"]:
+        events = calendar_store.upcoming(user, now, limit=10)
+        # The list changes when an event in it ends (or when the store changes).
+        valid_until = min((calendar_store.parse_event_time(event['end']) for event in events), default=_NEVER)
+        entry = _dashboard_entry(_format_dashboard(events), version, valid_until)
+        with _dashboards_lock:
+            _dashboards[user] = entry
+            _dashboards.move_to_end(user)
+            while len(_dashboards) > DASHBOARD_CACHE_SIZE:
+                _dashboards.popitem(last=False)
+    return entry["body"], entry["etag"]
+
+async def astream_agent(user_input: str, session_id: str = DEFAULT_USER):
+    """
+    Streams one agent turn as (event, data) pairs:
+    ("tool_start", {...}), ("tool_end", {...}), ("token", {"text": ...})
+    and finally ("done", {"response": full_text}).
+    """
+    # No reset here: the streaming response may close this generator from
+    # another context, and the variables die with the request task anyway.
+    sessions.set_current_user(session_id)
+    answer = await run_blocking(_fast_path, session_id, user_input)
+    if answer is None:
+        answer, versions = await run_blocking(_cached_answer, session_id, user_input)
+    if answer is not None:
+        yield "done", {"response": answer}
+        return
+    turn = await run_blocking(_start_turn, session_id, user_input)
+    _active_turn.set(turn)
+    
+    started = time.perf_counter()
+    final_state = None
+    executor = await run_blocking(get_agent_executor)
+    async for event in executor.astream_events({"messages": turn["messages"]}, version="v2",
+                                               config=telemetry.llm_config()):
+        kind = event["event"]
+        if kind == "on_tool_start":
+            yield "tool_start", {"tool": event["name"], "input": event["data"].get("input")}
+        elif kind == "on_tool_end":
+            yield "tool_end", {"tool": event["name"]}
+        elif kind == "on_chat_model_stream":
+            chunk = event["data"]["chunk"]
+            # Chunks that only carry tool-call arguments have no user-facing text.
+            text = _flatten_content(chunk.content)
+            if text:
+                yield "token", {"text": text}
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            final_state = event["data"]["output"]
+    
+    if not final_state or not final_state.get("messages"):
+        yield "error", {"detail": "The agent finished without a response."}
+        return
+    
+    final_message = final_state["messages"][-1]
+    answer = _flatten_content(final_message.content)
+    await run_blocking(_finish_turn, session_id, turn, final_state["messages"])
+    _cache_answer(session_id, user_input, versions, turn, final_state["messages"], answer, time.perf_counter() - started)
+    yield "done", {"response": answer}
+
+async def aget_dashboard(session_id: str = DEFAULT_USER):
+    """
+    Async wrapper for the /next-event dashboard endpoints. Simultaneous polls
+    from one session (several tabs, a reconnecting client) share one lookup
+    instead of each holding a worker thread.
+    """
+    return await singleflight.ado(("next_event", session_id),
+                                  lambda: run_blocking(get_dashboard, session_id))
+
@@ -1,11 +1,11 @@
 import os
-import json
 os.environ['OAUTHLIB_RELAX_TOKEN_SCOPE'] = '1'
 
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse
-from google_auth_oauthlib.flow import Flow
 from dotenv import load_dotenv
+from google_clients import save_credentials
+from sessions import session_id_for
 
 load_dotenv()
 
@@ -26,6 +26,7 @@ SCOPES = [
 ]
 
 def create_flow():
+    from google_auth_oauthlib.flow import Flow # Imported lazily to keep startup fast.
     return Flow.from_client_config(
         {
             "web": {
@@ -40,8 +41,11 @@ def create_flow():
     )
 
 @router.get("/login")
-async def login():
+async def login(request: Request):
     """Redirects the user to Google to log in."""
+    # Make sure the session cookie exists before leaving for Google, so the
+    # callback stores the credentials under this browser's session.
+    session_id_for(request)
     flow = create_flow()
     authorization_url, state = flow.authorization_url(
         access_type='offline',
@@ -61,18 +65,10 @@ async def callback(request: Request):
         flow.fetch_token(code=code)
         credentials = flow.credentials
 
-        creds_data = {
-            "token": credentials.token,
-            "refresh_token": credentials.refresh_token,
-            "token_uri": credentials.token_uri,
-            "client_id": credentials.client_id,
-            "client_secret": credentials.client_secret,
-            "scopes": credentials.scopes
-        }
-        with open("token.json", "w") as f:
-            json.dump(creds_data, f)
+        # Stores the credentials for this session and invalidates any cached Google clients.
+        save_credentials(credentials, user=session_id_for(request))
 
-        print("SUCCESS: Token saved to token.json")
+        print("SUCCESS: Credentials saved for session")
 
         return RedirectResponse(url=f"{FRONTEND_URL}?token=authorized")
         
@@ -0,0 +1,83 @@
+"""
+Cold-start check for the backend.
+
+Measures the cumulative import time of `main` (via `python -X importtime`)
+and, optionally, how long a fresh uvicorn process takes to answer /health.
+Exits non-zero when the import time is over budget, so it can gate CI.
+
+    cd backend
+    python -m benchmarks.cold_start --budget-ms 1500
+    python -m benchmarks.cold_start --serve
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import urllib.request
+
+
+def import_time(module="main"):
+    """Returns (total seconds, [(seconds, module)] slowest first) for importing `module`."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import failed")
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1e6, name.rstrip()))
+    # Top-level imports are the ones without leading indentation.
+    total = sum(seconds for seconds, name in rows if not name.startswith("  "))
+    slowest = sorted(((s, n.strip()) for s, n in rows), reverse=True)
+    return total, slowest
+
+
+def time_to_health(port, timeout=60.0):
+    """Starts uvicorn and returns the seconds until /health first answers 200."""
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"/health did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("COLD_START_BUDGET_MS", "1500")),
+                        help="fail when importing main takes longer than this")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--serve", action="store_true", help="also time uvicorn startup to the first /health")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    total, slowest = import_time()
+    print(f"import main: {total * 1000:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for seconds, name in slowest[:args.top]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+    if args.serve:
+        print(f"first /health: {time_to_health(args.port) * 1000:.0f} ms")
+
+    if total * 1000 > args.budget_ms:
+        print("Import time is over budget.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""
+Offline stand-ins for Gemini, Gmail and Google Calendar.
+
+The fakes mimic the slice of the googleapiclient interface the backend uses
+(`service.users().messages().list(...).execute()`, batch requests, sync
+tokens) and sleep for a configurable latency per upstream round trip, so
+the backend code under test runs unchanged.
+"""
+import time
+import base64
+import asyncio
+import datetime
+import threading
+from collections import Counter
+from typing import Any, List, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from compaction import estimate_tokens
+
+
+class _Request:
+    """A deferred upstream call, like googleapiclient's HttpRequest."""
+
+    def __init__(self, upstream, method, fn):
+        self.upstream, self.method, self.fn = upstream, method, fn
+
+    def execute(self):
+        self.upstream.hit(self.method)
+        return self.fn()
+
+
+class _Upstream:
+    def __init__(self, latency):
+        self.latency = latency
+        self.hits = Counter()
+        self._lock = threading.Lock()
+
+    def hit(self, method):
+        with self._lock:
+            self.hits[method] += 1
+        time.sleep(self.latency)
+
+
+class _Batch:
+    def __init__(self, upstream, callback):
+        self.upstream, self.callback, self.requests = upstream, callback, []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        # One round trip for the whole batch, as with Gmail's batch endpoint.
+        self.upstream.hit("batch")
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.fn(), None)
+            except Exception as e:
+                self.callback(request_id, None, e)
+
+
+class FakeGmail(_Upstream):
+    """An in-memory mailbox with `size` messages, newest first."""
+
+    def __init__(self, size=200, latency=0.05):
+        super().__init__(latency)
+        now_ms = int(time.time() * 1000)
+        self.mailbox = []
+        for i in range(size):
+            body = f"Hi, update #{i}: Project {i % 7} is on track. Let's sync on Friday. " * 5
+            self.mailbox.append({
+                "id": f"m{size - i:06d}",
+                "internalDate": str(now_ms - i * 60_000),
+                "labelIds": ["INBOX"],
+                "payload": {
+                    "mimeType": "text/plain",
+                    "headers": [{"name": "Subject", "value": f"Status update {i}"},
+                                {"name": "From", "value": f"sender{i % 13}@example.org"}],
+                    "body": {"data": base64.urlsafe_b64encode(body.encode()).decode()},
+                },
+            })
+        self.history_id = 1000
+        # History records newer than the starting history ID, oldest first.
+        self.history_records = []
+        # message id -> [HTTP status for each upcoming messages.get of it]
+        self.failures = {}
+
+    def _record(self, kind, item):
+        self.history_id += 1
+        self.history_records.append({"id": str(self.history_id), kind: [item]})
+
+    def deliver(self, subject, body="New message."):
+        """A message arriving in the inbox; shows up as messagesAdded in history."""
+        message = {
+            "id": f"n{self.history_id + 1:06d}",
+            "internalDate": str(int(time.time() * 1000)),
+            "labelIds": ["INBOX"],
+            "payload": {
+                "mimeType": "text/plain",
+                "headers": [{"name": "Subject", "value": subject}, {"name": "From", "value": "new@example.org"}],
+                "body": {"data": base64.urlsafe_b64encode(body.encode()).decode()},
+            },
+        }
+        self.mailbox.insert(0, message)
+        self._record("messagesAdded", {"message": {"id": message["id"], "labelIds": message["labelIds"]}})
+        return message["id"]
+
+    def relabel(self, message_id, add=(), remove=()):
+        """Adds/removes labels (e.g. TRASH to trash a message, removing it to restore one)."""
+        message = next(m for m in self.mailbox if m["id"] == message_id)
+        message["labelIds"] = [label for label in message["labelIds"] if label not in remove] + list(add)
+        ref = {"id": message_id, "labelIds": list(message["labelIds"])}
+        if add:
+            self._record("labelsAdded", {"message": ref, "labelIds": list(add)})
+        if remove:
+            self._record("labelsRemoved", {"message": ref, "labelIds": list(remove)})
+
+    def fail(self, message_id, *statuses):
+        """Makes the next messages.get calls for message_id fail with these HTTP statuses, in order."""
+        self.failures.setdefault(message_id, []).extend(statuses)
+
+    # googleapiclient-style resource accessors
+    def users(self): return self
+    def messages(self): return self
+    def history(self): return self
+
+    def getProfile(self, userId):
+        return _Request(self, "getProfile", lambda: {"historyId": str(self.history_id)})
+
+    def list(self, userId, maxResults=100, q=None, pageToken=None, startHistoryId=None, historyTypes=None):
+        if startHistoryId is not None:
+            # Like Gmail, only the requested kinds of change are reported.
+            kinds = {"messageAdded": "messagesAdded", "messageDeleted": "messagesDeleted",
+                     "labelAdded": "labelsAdded", "labelRemoved": "labelsRemoved"}
+            wanted = {kinds[kind] for kind in historyTypes or kinds}
+
+            def changes():
+                records = [{key: value for key, value in record.items() if key == "id" or key in wanted}
+                           for record in self.history_records if int(record["id"]) > int(startHistoryId)]
+                return {"history": [record for record in records if len(record) > 1], "historyId": str(self.history_id)}
+            return _Request(self, "history.list", changes)
+
+        def run():
+            # messages.list leaves out Trash and Spam.
+            matches = [m for m in self.mailbox
+                       if not {"TRASH", "SPAM"} & set(m["labelIds"])
+                       and (q is None or q.lower() in base64.urlsafe_b64decode(m["payload"]["body"]["data"]).decode().lower())]
+            start = int(pageToken or 0)
+            page = matches[start:start + maxResults]
+            result = {"messages": [{"id": m["id"]} for m in page]}
+            if start + maxResults < len(matches):
+                result["nextPageToken"] = str(start + maxResults)
+            return result
+        return _Request(self, "messages.list", run)
+
+    def get(self, userId, id, **kwargs):
+        def run():
+            statuses = self.failures.get(id)
+            if statuses:
+                status = statuses.pop(0)
+                raise HttpError(httplib2.Response({"status": status}), b"{}")
+            return next(m for m in self.mailbox if m["id"] == id)
+        return _Request(self, "messages.get", run)
+
+    def send(self, userId, body):
+        return _Request(self, "messages.send", lambda: {"id": "sent"})
+
+    def new_batch_http_request(self, callback):
+        return _Batch(self, callback)
+
+
+class FakeCalendar(_Upstream):
+    """A primary calendar with `size` one-hour events spread over the coming weeks."""
+
+    def __init__(self, size=50, latency=0.05):
+        super().__init__(latency)
+        start = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+        self.items = {}
+        for i in range(size):
+            begins = start + datetime.timedelta(hours=6 * (i + 1))
+            self._put({
+                "id": f"e{i}",
+                "summary": f"Meeting {i}",
+                "start": {"dateTime": begins.isoformat()},
+                "end": {"dateTime": (begins + datetime.timedelta(hours=1)).isoformat()},
+            })
+        self.changes = []
+
+    def _put(self, event):
+        self.items[event["id"]] = event
+
+    def events(self):
+        return self
+
+    def external_change(self, summary, begins=None):
+        """An event created elsewhere (another device); shows up in the next incremental sync."""
+        if begins is None:
+            begins = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+        event = {
+            "id": f"x{len(self.items)}",
+            "summary": summary,
+            "start": {"dateTime": begins.isoformat()},
+            "end": {"dateTime": (begins + datetime.timedelta(hours=1)).isoformat()},
+        }
+        self._put(event)
+        self.changes.append(event)
+
+    def list(self, calendarId, syncToken=None, **params):
+        def run():
+            if syncToken is not None:
+                items, self.changes = self.changes, []
+            else:
+                items = list(self.items.values())
+                at = lambda value: datetime.datetime.fromisoformat(value)
+                if params.get("timeMin"):
+                    items = [e for e in items if at(e["end"]["dateTime"]) > at(params["timeMin"])]
+                if params.get("timeMax"):
+                    items = [e for e in items if at(e["start"]["dateTime"]) < at(params["timeMax"])]
+                if params.get("q"):
+                    items = [e for e in items if params["q"].lower() in e["summary"].lower()]
+                items = items[:params.get("maxResults", 250)]
+            return {"items": items, "nextSyncToken": "sync"}
+        return _Request(self, "events.list", run)
+
+    def insert(self, calendarId, body):
+        def run():
+            event = dict(body, id=f"e{len(self.items) + 1000}", htmlLink="https://calendar.example/event")
+            self._put(event)
+            self.changes.append(event)
+            return event
+        return _Request(self, "events.insert", run)
+
+    def delete(self, calendarId, eventId):
+        def run():
+            event = self.items.pop(eventId, None)
+            if event:
+                self.changes.append({"id": eventId, "status": "cancelled"})
+            return ""
+        return _Request(self, "events.delete", run)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    A deterministic stand-in for Gemini. On a fresh user message it asks for
+    the tools in `tool_plan` (all in one step); once tool results are in, it
+    answers with `final_answer`. A bare prompt (the history summarizer) gets
+    a short summary back. Every call sleeps `latency` seconds and agent calls
+    record the estimated prompt tokens they were sent.
+    """
+
+    tool_plan: List[dict] = []
+    final_answer: str = "Done."
+    latency: float = 0.3
+    prompt_tokens: List[int] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        return self
+
+    def _respond(self, messages):
+        last = messages[-1] if messages else None
+        if len(messages) == 1 and isinstance(last, HumanMessage):
+            # A bare prompt with no system message is the history summarizer.
+            summary = "- " + " ".join(str(last.content).split())[-300:]
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=summary))])
+        self.prompt_tokens.append(sum(estimate_tokens(m) for m in messages))
+        if isinstance(last, HumanMessage) and self.tool_plan:
+            calls = [{"name": step["name"], "args": step.get("args", {}), "id": f"call_{i}", "type": "tool_call"}
+                     for i, step in enumerate(self.tool_plan)]
+            message = AIMessage(content="", tool_calls=calls)
+        else:
+            message = AIMessage(content=self.final_answer)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
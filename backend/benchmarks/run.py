@@ -0,0 +1,541 @@
+"""
+Offline end-to-end benchmarks for the backend.
+
+Runs the real tools, run_agent and the FastAPI app against a scripted fake
+chat model and in-process fake Gmail/Calendar services (see fakes.py), and
+optionally a local Postgres. Nothing talks to Google or Render.
+
+    cd backend
+    python -m benchmarks.run                                  # no database
+    python -m benchmarks.run --database-url postgresql://localhost/sentient_bench
+    python -m benchmarks.run --compare benchmarks/results/previous.json
+
+The memory table of --database-url is written to and wiped; point it at a
+throwaway database.
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import datetime
+import argparse
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+
+def _configure_environment(args):
+    # Must happen before the backend modules are imported: they read their
+    # configuration at import time. An empty DATABASE_URL also keeps
+    # load_dotenv() from pulling a real database in from .env.
+    os.environ["DATABASE_URL"] = args.database_url or ""
+    if args.database_url:
+        os.environ.setdefault("DB_SSLMODE", "disable")
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    os.environ["MAILBOX_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="sentient-bench-"), "mailbox.db")
+
+
+# A small, hand-labelled sample of chat messages and the fast-path intent each
+# should get (None: needs the full agent), for measuring the router's hit rate.
+QUERY_CORPUS = [
+    ("What's my next meeting?", "next_event"),
+    ("when is my next appointment", "next_event"),
+    ("Next call please", "next_event"),
+    ("Show me my next event.", "next_event"),
+    ("What's my next meeting with Sam?", None),
+    ("Move my next meeting to 3pm", None),
+    ("What do you know about me?", "memory_dump"),
+    ("show me your memories", "memory_dump"),
+    ("What have you remembered about me", "memory_dump"),
+    ("Remember that I prefer morning meetings", None),
+    ("Check my inbox", "latest_emails"),
+    ("Show me my latest emails", "latest_emails"),
+    ("what's in my inbox?", "latest_emails"),
+    ("recent mails", "latest_emails"),
+    ("Any emails from Joel about the budget?", None),
+    ("Read my latest emails and reply to Priya", None),
+    ("Am I free for lunch tomorrow?", None),
+    ("Schedule a call with Dana on Friday at 10", None),
+    ("Cancel my dentist appointment", None),
+    ("Summarize this week for me", None),
+]
+
+
+def memory_fact(i):
+    """(key, value, namespace) for the i-th synthetic fact; topics rotate so a query matches a slice of them."""
+    templates = [
+        ("meeting preference {i}", "Prefers meetings after {h} PM on {day}s", "preferences"),
+        ("project {p} deadline {i}", "Project {p} is due on 2026-{m:02d}-{d:02d}", "projects"),
+        ("contact {i}", "Contact {i} at Company {p} handles invoicing", "contacts"),
+        ("travel {i}", "Prefers aisle seats on flights to City {p}", "travel"),
+        ("diet {i}", "Avoids dish {p} at team lunches", "general"),
+    ]
+    key, value, namespace = templates[i % len(templates)]
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    fields = {"i": i, "h": i % 12 + 1, "day": days[i % 5], "p": i % 97, "m": i % 12 + 1, "d": i % 28 + 1}
+    return key.format(**fields), value.format(**fields), namespace
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def summarize(name, latencies, elapsed, concurrency=1, **extra):
+    result = {
+        "scenario": name,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    result.update(extra)
+    return result
+
+
+class Bench:
+    def __init__(self, args):
+        import agent
+        import main
+        from benchmarks.fakes import FakeCalendar, FakeGmail, ScriptedChatModel
+
+        self.args = args
+        self.agent = agent
+        self.app = main.app
+        self.gmail = FakeGmail(size=args.mailbox_size, latency=args.google_latency)
+        self.calendar = FakeCalendar(size=args.calendar_size, latency=args.google_latency)
+        self.model = ScriptedChatModel(
+            latency=args.llm_latency,
+            tool_plan=[{"name": "consult_memory", "args": {"query": "meeting preferences"}},
+                       {"name": "list_events", "args": {}}],
+            final_answer="You're free after 2 PM tomorrow.",
+        )
+
+        agent.get_google_service = self._service
+        agent.set_llm(self.model)
+        self.results = []
+
+    def _service(self, service_name, version, user=None):
+        return self.gmail if service_name == "gmail" else self.calendar
+
+    def upstream_hits(self):
+        return sum(self.gmail.hits.values()) + sum(self.calendar.hits.values())
+
+    def run_memory_lookups(self, count):
+        """consult_memory over a table of `count` facts spread across a few topics."""
+        agent = self.agent
+        agent.clear_memory()
+        for i in range(count):
+            agent.save_to_memory(*memory_fact(i))
+        agent.flush_memory()
+        label = f"{count} facts"
+        self.run_tool(f"save_to_memory ({label})", agent.save_to_memory, "Meeting preference", "No meetings before 10 AM")
+        self.run_tool(f"consult_memory(all) ({label})", agent.consult_memory, "all")
+        self.run_tool(f"consult_memory(query) ({label})", agent.consult_memory, "meeting preferences")
+        self.run_tool(f"consult_memory(all, page 2) ({label})", agent.consult_memory, "all", "", "", 2)
+        self.run_tool(f"consult_memory(changed since) ({label})", agent.consult_memory, "all", "",
+                      (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=5)).isoformat())
+
+    def run_connection_reuse(self):
+        """
+        save_to_memory (written straight through) and a consult_memory search,
+        first opening a new psycopg2 connection per call as the tools did
+        before the pool, then through db_connection's pool.
+        """
+        import psycopg2
+        import db
+
+        @contextmanager
+        def connect_per_call():
+            try:
+                conn = psycopg2.connect(db.DB_URL, sslmode=db.DB_SSLMODE, connect_timeout=db.DB_CONNECT_TIMEOUT)
+            except Exception as e:
+                print(f"DB Connection Error: {e}")
+                yield None
+                return
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+        agent = self.agent
+        pooled, write_behind = agent.db_connection, agent.MEMORY_WRITE_BEHIND
+        agent.MEMORY_WRITE_BEHIND = False
+        try:
+            for label, connection in (("connect per call", connect_per_call), ("pooled", pooled)):
+                agent.db_connection = connection
+                self.run_tool(f"save_to_memory ({label})", agent.save_to_memory,
+                              "Meeting preference", "No meetings before 10 AM")
+                self.run_tool(f"consult_memory(query) ({label})", agent.consult_memory, "meeting preferences")
+        finally:
+            agent.db_connection, agent.MEMORY_WRITE_BEHIND = pooled, write_behind
+
+    def run_message_fetch(self, count):
+        """
+        Loading `count` full messages: one messages.get round trip per id (how
+        read_emails used to fetch), then gmail.fetch_messages' batch requests.
+        """
+        import gmail
+
+        ids = [message["id"] for message in self.gmail.mailbox[:count]]
+
+        def one_by_one():
+            return [self.gmail.users().messages().get(userId='me', id=message_id, format='full',
+                                                      fields=gmail.MESSAGE_FIELDS).execute()
+                    for message_id in ids]
+
+        self.run_tool(f"fetch {count} messages (one get per id)", one_by_one)
+        self.run_tool(f"fetch {count} messages (batch)", gmail.fetch_messages, self.gmail, ids)
+
+    def run_tool(self, name, func, *args):
+        latencies = []
+        hits_before = self.upstream_hits()
+        start = time.perf_counter()
+        for _ in range(self.args.iterations):
+            t0 = time.perf_counter()
+            result = func(*args)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+        self.results.append(summarize(
+            f"tool:{name}", latencies, elapsed,
+            upstream_calls=self.upstream_hits() - hits_before,
+            output_tokens=len(str(result)) // 4,
+        ))
+
+    async def run_http(self, name, method, path, concurrency, body=None, prompt_tokens=False, shared_session=False):
+        import httpx
+
+        transport = httpx.ASGITransport(app=self.app)
+        pending = iter(range(self.args.requests))
+        latencies = []
+        self.model.prompt_tokens.clear()
+
+        async def requests(client):
+            for _ in pending:
+                t0 = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+
+        async def client_loop():
+            # One client per simulated user, so each gets its own session cookie.
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                await requests(client)
+
+        if shared_session:
+            # Many tabs of one user: a first request sets the session cookie they all send.
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                (await client.request(method, path, json=body)).raise_for_status()
+                hits_before = self.upstream_hits()
+                start = time.perf_counter()
+                await asyncio.gather(*(requests(client) for _ in range(concurrency)))
+                elapsed = time.perf_counter() - start
+        else:
+            hits_before = self.upstream_hits()
+            start = time.perf_counter()
+            await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+        extra = {"upstream_calls": self.upstream_hits() - hits_before}
+        if prompt_tokens and self.model.prompt_tokens:
+            extra["prompt_tokens_mean"] = round(sum(self.model.prompt_tokens) / len(self.model.prompt_tokens), 1)
+            extra["prompt_tokens_max"] = max(self.model.prompt_tokens)
+            extra["llm_calls"] = len(self.model.prompt_tokens)
+        self.results.append(summarize(f"http:{method} {path} {name}".strip(), latencies, elapsed, concurrency, **extra))
+
+    def run(self):
+        agent = self.agent
+        self.run_tool("list_events", agent.list_events)
+        self.run_tool("read_emails(latest)", agent.read_emails, "latest")
+        self.run_tool("read_emails(keyword)", agent.read_emails, "Project 3")
+        self.run_tool("read_emails(operator)", agent.read_emails, "from:sender1@example.org")
+        self.run_message_fetch(50)
+        if self.args.database_url:
+            # The tool scenarios call clear_memory directly, before any request has created the tables.
+            agent.ensure_schema()
+            self.run_memory_burst(self.args.burst_facts)
+            self.run_connection_reuse()
+            for count in self.args.memory_facts:
+                self.run_memory_lookups(count)
+
+        import response_cache
+        cache_enabled = response_cache.RESPONSE_CACHE_ENABLED
+        for concurrency in self.args.concurrency:
+            asyncio.run(self.run_http("", "GET", "/next-event", concurrency))
+            # Every simulated user repeats the same question, so the agent scenario runs uncached.
+            response_cache.RESPONSE_CACHE_ENABLED = False
+            asyncio.run(self.run_http("(agent)", "POST", "/chat", concurrency,
+                                      body={"message": "Am I free for lunch tomorrow?"}, prompt_tokens=True))
+            response_cache.RESPONSE_CACHE_ENABLED = cache_enabled
+            if cache_enabled:
+                asyncio.run(self.run_http("(agent, response cache)", "POST", "/chat", concurrency,
+                                          body={"message": "Am I free for lunch tomorrow?"}, prompt_tokens=True))
+                self.results[-1]["response_cache"] = response_cache.stats()
+            asyncio.run(self.run_http("(fast path)", "POST", "/chat", concurrency,
+                                      body={"message": "What's my next meeting?"}, prompt_tokens=True))
+        self.run_coalescing(max(self.args.concurrency))
+        asyncio.run(self.run_tool_step())
+        asyncio.run(self.run_query_corpus())
+        asyncio.run(self.run_long_conversation(self.args.long_turns))
+        for conditional in (False, True):
+            asyncio.run(self.run_dashboard_hour(conditional))
+        return self.results
+
+    async def run_query_corpus(self):
+        """
+        Every QUERY_CORPUS message once through /chat (response cache off),
+        with the share the router answers without the agent and any message
+        it routed differently from its label.
+        """
+        import httpx
+        import router
+        import response_cache
+
+        cache_enabled = response_cache.RESPONSE_CACHE_ENABLED
+        response_cache.RESPONSE_CACHE_ENABLED = False
+        latencies, routed, recalled, misrouted = [], 0, 0, []
+        start = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://bench") as client:
+                for message, expected in QUERY_CORPUS:
+                    intent = router.classify(message)
+                    routed += intent is not None
+                    recalled += expected is not None and intent == expected
+                    if intent != expected:
+                        misrouted.append(message)
+                    t0 = time.perf_counter()
+                    response = await client.post("/chat", json={"message": message})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - t0)
+        finally:
+            response_cache.RESPONSE_CACHE_ENABLED = cache_enabled
+        elapsed = time.perf_counter() - start
+        labelled = sum(1 for _, expected in QUERY_CORPUS if expected is not None)
+        self.results.append(summarize(
+            f"corpus:POST /chat x{len(QUERY_CORPUS)} (mixed queries)", latencies, elapsed,
+            router_hit_rate=round(routed / len(QUERY_CORPUS), 3),
+            router_recall=round(recalled / labelled, 3),
+            misrouted=misrouted,
+        ))
+
+    async def run_long_conversation(self, turns):
+        """
+        One session chatting for `turns` distinct turns, to show the prompt
+        staying within CHAT_TOKEN_BUDGET as compaction folds old turns away.
+        """
+        import httpx
+        import response_cache
+
+        cache_enabled = response_cache.RESPONSE_CACHE_ENABLED
+        response_cache.RESPONSE_CACHE_ENABLED = False
+        self.model.prompt_tokens.clear()
+        latencies, checkpoints = [], {}
+        start = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://bench") as client:
+                for i in range(1, turns + 1):
+                    t0 = time.perf_counter()
+                    response = await client.post("/chat", json={"message": f"Turn {i}: am I free on day {i} of the quarter?"})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - t0)
+                    if i in (1, 10, 50, 100, turns):
+                        # First model call of the turn: the full history as sent to Gemini.
+                        checkpoints[str(i)] = self.model.prompt_tokens[-2]
+        finally:
+            response_cache.RESPONSE_CACHE_ENABLED = cache_enabled
+        elapsed = time.perf_counter() - start
+        self.results.append(summarize(
+            f"conversation:POST /chat x{turns} (one session)", latencies, elapsed,
+            prompt_tokens_at_turn=checkpoints, prompt_tokens_max=max(self.model.prompt_tokens),
+        ))
+
+    async def run_dashboard_hour(self, conditional):
+        """
+        One dashboard polling /next-event every --poll-interval seconds for a
+        simulated hour, with the calendar changing twice. Every poll is due a
+        calendar sync; a conditional client sends If-None-Match.
+        """
+        import httpx
+        import calendar_store
+
+        polls = int(3600 / self.args.poll_interval)
+        changes = {polls // 3, 2 * polls // 3}
+        interval = calendar_store.CALENDAR_SYNC_INTERVAL
+        calendar_store.CALENDAR_SYNC_INTERVAL = 0
+        latencies, statuses, transferred = [], {}, 0
+        hits_before = self.upstream_hits()
+        start = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://bench") as client:
+                etag = None
+                for i in range(polls):
+                    if i in changes:
+                        self.calendar.external_change(f"Added elsewhere {i}")
+                    headers = {"If-None-Match": etag} if conditional and etag else {}
+                    t0 = time.perf_counter()
+                    response = await client.get("/next-event", headers=headers)
+                    latencies.append(time.perf_counter() - t0)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    transferred += len(response.content) + sum(len(k) + len(v) + 4 for k, v in response.headers.raw)
+                    if response.status_code == 200:
+                        etag = response.headers.get("etag")
+        finally:
+            calendar_store.CALENDAR_SYNC_INTERVAL = interval
+        elapsed = time.perf_counter() - start
+        label = "If-None-Match" if conditional else "unconditional"
+        self.results.append(summarize(
+            f"hour:GET /next-event ({label})", latencies, elapsed,
+            upstream_calls=self.upstream_hits() - hits_before,
+            bytes=transferred, statuses={str(code): count for code, count in sorted(statuses.items())},
+        ))
+
+    def run_memory_burst(self, count):
+        """An inbox scan's worth of save_to_memory calls, row by row and then write-behind."""
+        agent = self.agent
+        write_behind = agent.MEMORY_WRITE_BEHIND
+        try:
+            for agent.MEMORY_WRITE_BEHIND in (False, True):
+                agent.clear_memory()
+                latencies = []
+                start = time.perf_counter()
+                for i in range(count):
+                    t0 = time.perf_counter()
+                    agent.save_to_memory(f"burst fact {i % (count // 2 or 1)}", f"Observed in email {i}")
+                    latencies.append(time.perf_counter() - t0)
+                agent.flush_memory()
+                elapsed = time.perf_counter() - start
+                label = "on" if agent.MEMORY_WRITE_BEHIND else "off"
+                self.results.append(summarize(f"burst:save_to_memory x{count} (write-behind {label})",
+                                              latencies, elapsed, burst_ms=round(elapsed * 1000, 2)))
+        finally:
+            agent.MEMORY_WRITE_BEHIND = write_behind
+
+    async def run_tool_step(self):
+        """
+        One agent tool step with several read calls, run through the agent's
+        ToolNode twice: with every call treated as a side effect (one after
+        another, as before calls in a step ran concurrently) and as shipped,
+        where only side effects are serialized. Every call is due an upstream
+        sync and the tool cache is off, so each one pays the Google latency.
+        """
+        from langchain_core.messages import AIMessage
+        from langgraph.graph import StateGraph, MessagesState, START, END
+        import sessions
+        import calendar_store
+        import mail_mirror
+        import tool_cache
+
+        agent = self.agent
+        plan = [("list_events", {}), ("read_emails", {"search_term": "latest"})]
+        if self.args.database_url:
+            plan += [("consult_memory", {"query": "meeting preferences"}), ("consult_memory", {"query": "all"})]
+        calls = [{"name": name, "args": args, "id": f"step_{i}", "type": "tool_call"} for i, (name, args) in enumerate(plan)]
+        graph = StateGraph(MessagesState)
+        graph.add_node("tools", agent.tool_node())
+        graph.add_edge(START, "tools")
+        graph.add_edge("tools", END)
+        step = graph.compile()
+
+        saved = (agent.SIDE_EFFECT_TOOLS, dict(tool_cache.TOOL_CACHE_TTLS),
+                 calendar_store.CALENDAR_SYNC_INTERVAL, mail_mirror.MAILBOX_SYNC_INTERVAL)
+        tool_cache.TOOL_CACHE_TTLS.update({name: 0 for name, _ in plan})
+        calendar_store.CALENDAR_SYNC_INTERVAL = mail_mirror.MAILBOX_SYNC_INTERVAL = 0
+        sessions.set_current_user("bench-step")
+        try:
+            # The first step's full syncs would land in whichever mode ran first.
+            await step.ainvoke({"messages": [AIMessage(content="", tool_calls=calls)]})
+            for label, serialized in (("sequential", {name for name, _ in plan}), ("concurrent", set())):
+                agent.SIDE_EFFECT_TOOLS = saved[0] | serialized
+                latencies = []
+                hits_before = self.upstream_hits()
+                start = time.perf_counter()
+                for _ in range(self.args.iterations):
+                    t0 = time.perf_counter()
+                    await step.ainvoke({"messages": [AIMessage(content="", tool_calls=calls)]})
+                    latencies.append(time.perf_counter() - t0)
+                elapsed = time.perf_counter() - start
+                self.results.append(summarize(f"step:{len(calls)} read tools ({label})", latencies, elapsed,
+                                              upstream_calls=self.upstream_hits() - hits_before))
+        finally:
+            agent.SIDE_EFFECT_TOOLS = saved[0]
+            tool_cache.TOOL_CACHE_TTLS.update(saved[1])
+            calendar_store.CALENDAR_SYNC_INTERVAL, mail_mirror.MAILBOX_SYNC_INTERVAL = saved[2], saved[3]
+
+    def run_coalescing(self, concurrency):
+        """Same-session /next-event bursts with every poll due a sync, with and without single-flight."""
+        import calendar_store
+        import singleflight
+
+        interval, enabled = calendar_store.CALENDAR_SYNC_INTERVAL, singleflight.SINGLEFLIGHT_ENABLED
+        calendar_store.CALENDAR_SYNC_INTERVAL = 0
+        try:
+            for singleflight.SINGLEFLIGHT_ENABLED in (False, True):
+                label = "on" if singleflight.SINGLEFLIGHT_ENABLED else "off"
+                asyncio.run(self.run_http(f"(one session, single-flight {label})", "GET", "/next-event",
+                                          concurrency, shared_session=True))
+        finally:
+            calendar_store.CALENDAR_SYNC_INTERVAL, singleflight.SINGLEFLIGHT_ENABLED = interval, enabled
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def print_table(results, baseline=None):
+    previous = {(r["scenario"], r["concurrency"]): r for r in (baseline or {}).get("results", [])}
+    print(f"{'scenario':<40} {'conc':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>8} {'upstream':>8}")
+    for r in results:
+        line = (f"{r['scenario']:<40} {r['concurrency']:>4} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+                f"{r['p99_ms']:>9} {r['throughput_rps']:>8} {r.get('upstream_calls', ''):>8}")
+        before = previous.get((r["scenario"], r["concurrency"]))
+        if before and before["p95_ms"]:
+            line += f"   p95 {100 * (r['p95_ms'] - before['p95_ms']) / before['p95_ms']:+.1f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="local Postgres to use for the memory tools (optional)")
+    parser.add_argument("--iterations", type=int, default=50, help="calls per tool scenario")
+    parser.add_argument("--requests", type=int, default=100, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds per fake Gemini call")
+    parser.add_argument("--google-latency", type=float, default=0.05, help="seconds per fake Google round trip")
+    parser.add_argument("--mailbox-size", type=int, default=500)
+    parser.add_argument("--calendar-size", type=int, default=200)
+    parser.add_argument("--memory-facts", type=int, nargs="+", default=[1000],
+                        help="memory table sizes to run the consult_memory scenarios at")
+    parser.add_argument("--long-turns", type=int, default=200, help="turns in the long-conversation scenario")
+    parser.add_argument("--poll-interval", type=float, default=30, help="dashboard poll period in the simulated hour")
+    parser.add_argument("--burst-facts", type=int, default=500, help="save_to_memory calls in the write burst")
+    parser.add_argument("--out", default=os.path.join("benchmarks", "results", "latest.json"))
+    parser.add_argument("--compare", help="earlier results file to diff p95 against")
+    args = parser.parse_args(argv)
+
+    _configure_environment(args)
+    results = Bench(args).run()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"commit": git_commit(), "timestamp": time.time(), "config": vars(args), "results": results}, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
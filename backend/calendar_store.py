@@ -0,0 +1,195 @@
+import os
+import time
+import datetime
+import itertools
+import threading
+from collections import OrderedDict
+from googleapiclient.errors import HttpError
+
+
+# Minimum seconds between two incremental syncs for the same user.
+CALENDAR_SYNC_INTERVAL = float(os.getenv("CALENDAR_SYNC_INTERVAL", "30"))
+# The initial sync reaches this far back so list_events can show yesterday's events.
+CALENDAR_SYNC_LOOKBACK = datetime.timedelta(days=int(os.getenv("CALENDAR_SYNC_LOOKBACK_DAYS", "1")))
+# How far ahead the store reaches. With singleEvents every instance of a
+# recurring series is its own event, so an open-ended sync pages in years of
+# them. Later events are looked up live (delete_event falls back to search).
+CALENDAR_SYNC_HORIZON = datetime.timedelta(days=int(os.getenv("CALENDAR_SYNC_HORIZON_DAYS", "90")))
+# Users whose event store is kept in memory, least recently used evicted first.
+CALENDAR_STORE_SIZE = int(os.getenv("CALENDAR_STORE_SIZE", "256"))
+CALENDAR_ID = 'primary'
+
+_guard = threading.Lock()
+# user -> {"lock", "events": {id: event}, "sync_token", "synced_at", "version",
+#          "window_end", "ordered", "ordered_version"}
+_stores = OrderedDict()
+# Versions are drawn from one counter so a store rebuilt after eviction never
+# repeats a version an earlier store of the same user handed out.
+_versions = itertools.count(1)
+
+
+def _store_for(user):
+    with _guard:
+        store = _stores.get(user)
+        if store is not None:
+            _stores.move_to_end(user)
+        else:
+            store = _stores[user] = {
+                "lock": threading.Lock(),
+                "events": {},
+                "sync_token": None,
+                "synced_at": float("-inf"),
+                # Bumped whenever the event set may have changed.
+                "version": next(_versions),
+                # End of the synced window; a full sync moves it forward.
+                "window_end": None,
+                # (start, end, event) sorted by start, as of "ordered_version".
+                "ordered": [],
+                "ordered_version": None,
+            }
+            while len(_stores) > CALENDAR_STORE_SIZE:
+                _stores.popitem(last=False)
+        return store
+
+
+def parse_event_time(value):
+    """Turns an event's start/end ({'dateTime': ...} or {'date': ...}) into an aware datetime."""
+    if 'dateTime' in value:
+        parsed = datetime.datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed
+    return datetime.datetime.fromisoformat(value['date']).replace(tzinfo=datetime.timezone.utc)
+
+
+def _in_window(event, window_start, window_end):
+    return (parse_event_time(event['end']) > window_start
+            and (window_end is None or parse_event_time(event['start']) < window_end))
+
+
+def _apply_items(events, items, window_start, window_end):
+    """Applies changed events; ones cancelled or moved out of the synced window are dropped."""
+    for event in items:
+        if event.get('status') != 'cancelled' and 'start' in event and 'end' in event \
+                and _in_window(event, window_start, window_end):
+            events[event['id']] = event
+        else:
+            events.pop(event['id'], None)
+
+
+def _prune(store, window_start):
+    """Drops events that ended before the window. Returns True if any were dropped."""
+    ended = [event_id for event_id, event in store["events"].items()
+             if parse_event_time(event['end']) <= window_start]
+    for event_id in ended:
+        del store["events"][event_id]
+    return bool(ended)
+
+
+def _list_all(service, **params):
+    """Pages through events.list and returns (items, nextSyncToken)."""
+    items = []
+    page_token = None
+    while True:
+        result = service.events().list(calendarId=CALENDAR_ID, singleEvents=True,
+                                       maxResults=2500, pageToken=page_token, **params).execute()
+        items.extend(result.get('items', []))
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return items, result.get('nextSyncToken')
+
+
+def _full_sync(service, store):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    time_min, time_max = now - CALENDAR_SYNC_LOOKBACK, now + CALENDAR_SYNC_HORIZON
+    items, sync_token = _list_all(service, timeMin=time_min.isoformat(), timeMax=time_max.isoformat())
+    events = {}
+    _apply_items(events, items, time_min, time_max)
+    store["events"] = events
+    store["sync_token"] = sync_token
+    store["window_end"] = time_max
+    store["version"] = next(_versions)
+
+
+def sync(service, user, force=False):
+    """
+    Brings the user's event store up to date using Calendar sync tokens.
+    Calls within CALENDAR_SYNC_INTERVAL of the last sync are free.
+    """
+    store = _store_for(user)
+    with store["lock"]:
+        if not force and time.monotonic() - store["synced_at"] < CALENDAR_SYNC_INTERVAL:
+            return
+        now = datetime.datetime.now(datetime.timezone.utc)
+        # Sync tokens can't be combined with timeMax, so moving the window
+        # forward takes a full sync; do it once half the horizon is used up.
+        if store["sync_token"] is None or store["window_end"] - now < CALENDAR_SYNC_HORIZON / 2:
+            _full_sync(service, store)
+        else:
+            try:
+                window_start = now - CALENDAR_SYNC_LOOKBACK
+                items, sync_token = _list_all(service, syncToken=store["sync_token"])
+                _apply_items(store["events"], items, window_start, store["window_end"])
+                store["sync_token"] = sync_token
+                if _prune(store, window_start) or items:
+                    store["version"] = next(_versions)
+            except HttpError as e:
+                # 410 Gone: the sync token expired, start over.
+                if e.resp.status != 410:
+                    raise
+                _full_sync(service, store)
+        store["synced_at"] = time.monotonic()
+
+
+def _ordered(store):
+    """The store's events as (start, end, event) sorted by start; re-sorted only after a change."""
+    if store["ordered_version"] != store["version"]:
+        rows = [(parse_event_time(event['start']), parse_event_time(event['end']), event)
+                for event in store["events"].values()]
+        rows.sort(key=lambda row: row[0])
+        store["ordered"], store["ordered_version"] = rows, store["version"]
+    return store["ordered"]
+
+
+def upcoming(user, time_min, limit=10, title=None):
+    """
+    Events ending after time_min, ordered by start time, optionally filtered
+    by a case-insensitive title match.
+    """
+    store = _store_for(user)
+    with store["lock"]:
+        ordered = _ordered(store)
+
+    matches = []
+    for start, end, event in ordered:
+        if end <= time_min:
+            continue
+        if title is not None and title.lower() not in event.get('summary', '').lower():
+            continue
+        matches.append(event)
+        if limit is not None and len(matches) >= limit:
+            break
+    return matches
+
+
+def apply_upsert(user, event):
+    """Records an event created or updated through the API so reads see it immediately."""
+    store = _store_for(user)
+    with store["lock"]:
+        # Keep events created past the window out, as a sync would.
+        now = datetime.datetime.now(datetime.timezone.utc)
+        _apply_items(store["events"], [event], now - CALENDAR_SYNC_LOOKBACK, store["window_end"])
+        store["version"] = next(_versions)
+
+
+def apply_delete(user, event_id):
+    """Drops an event deleted through the API."""
+    store = _store_for(user)
+    with store["lock"]:
+        store["events"].pop(event_id, None)
+        store["version"] = next(_versions)
+
+
+def version(user):
+    """A counter that changes whenever the user's synced event set may have changed."""
+    return _store_for(user)["version"]
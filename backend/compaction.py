@@ -0,0 +1,78 @@
+import os
+from langchain_core.messages import HumanMessage, ToolMessage
+
+
+# Rough prompt budget for everything resent to Gemini each turn.
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "12000"))
+# The most recent turns are always kept verbatim, tool outputs included.
+CHAT_KEEP_TURNS = int(os.getenv("CHAT_KEEP_TURNS", "3"))
+# Older summaries are cut back to this share of the budget.
+SUMMARY_SHARE = 0.25
+
+
+def estimate_tokens(message):
+    """~4 characters per token; good enough for budgeting without a tokenizer round trip."""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    extra = str(getattr(message, "tool_calls", None) or "")
+    return (len(content) + len(extra)) // 4 + 4
+
+
+def _split_turns(messages):
+    """Groups messages into turns, each starting at a HumanMessage."""
+    turns = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _stub_tool_outputs(turn):
+    stubbed = []
+    for message in turn:
+        if isinstance(message, ToolMessage) and not str(message.content).startswith("[elided"):
+            message = ToolMessage(
+                content=f"[elided {message.name or 'tool'} output, {len(str(message.content))} chars]",
+                tool_call_id=message.tool_call_id,
+                name=message.name,
+            )
+        stubbed.append(message)
+    return stubbed
+
+
+def total_tokens(messages):
+    """Estimated prompt size of a history; the system prompt already carries the summary."""
+    return sum(estimate_tokens(m) for m in messages)
+
+
+def compact(messages, summary, summarize, budget=CHAT_TOKEN_BUDGET, keep_turns=CHAT_KEEP_TURNS):
+    """
+    Fits the history into the token budget. messages[0] is the system prompt,
+    which includes the current summary. Tool outputs outside the last
+    keep_turns turns become short stubs; if that is not enough, the oldest
+    turns are folded into the running summary with
+    summarize(previous_summary, dropped_messages) -> new_summary.
+    With summarize=None only the stubbing is done. Returns (messages, summary).
+    """
+    if not messages:
+        return messages, summary
+
+    system, turns = messages[0], _split_turns(messages[1:])
+    split = max(len(turns) - keep_turns, 0)
+    older = [_stub_tool_outputs(turn) for turn in turns[:split]]
+    recent = turns[split:]
+
+    def total():
+        return estimate_tokens(system) + sum(estimate_tokens(m) for turn in older + recent for m in turn)
+
+    dropped = []
+    while summarize is not None and older and total() > budget:
+        dropped.extend(older.pop(0))
+
+    if dropped:
+        summary = summarize(summary, dropped)
+        max_chars = int(budget * SUMMARY_SHARE) * 4
+        if len(summary) > max_chars:
+            summary = summary[-max_chars:]
+
+    return [system] + [m for turn in older + recent for m in turn], summary
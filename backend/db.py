@@ -0,0 +1,142 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool
+from psycopg2.extensions import cursor as base_cursor
+import telemetry
+
+
+DB_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Idle connections older than this (seconds) get a "SELECT 1" before reuse.
+DB_HEALTHCHECK_INTERVAL = float(os.getenv("DB_HEALTHCHECK_INTERVAL", "30"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# Render requires TLS; a local Postgres (benchmarks, development) usually has none.
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
+
+class TracedCursor(base_cursor):
+    """Cursor that records each statement as a 'db' span labelled by its SQL verb."""
+
+    @staticmethod
+    def _verb(query):
+        text = query.decode() if isinstance(query, bytes) else str(query)
+        words = text.split(None, 1)
+        return words[0].upper() if words else "EMPTY"
+
+    def execute(self, query, vars=None):
+        with telemetry.span("db", self._verb(query)):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        with telemetry.span("db", self._verb(query)):
+            return super().executemany(query, vars_list)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises when exhausted, so callers queue on this instead.
+_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_last_used = {}
+
+
+def get_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                extra = {"cursor_factory": TracedCursor} if telemetry.ENABLED else {}
+                _pool = pool.ThreadedConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, DB_URL,
+                    sslmode=DB_SSLMODE, connect_timeout=DB_CONNECT_TIMEOUT, **extra
+                )
+    return _pool
+
+
+def _is_healthy(conn):
+    """Cheap liveness check for a pooled connection."""
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_HEALTHCHECK_INTERVAL:
+        return True  # Freshly opened or recently used.
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout(db_pool):
+    conn = db_pool.getconn()
+    if _is_healthy(conn):
+        return conn
+    # Broken connection (server restart, idle timeout, network blip): replace it.
+    _last_used.pop(id(conn), None)
+    db_pool.putconn(conn, close=True)
+    return db_pool.getconn()
+
+
+def _release(db_pool, conn, broken=False):
+    if broken or conn.closed:
+        _last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+        return
+    try:
+        conn.rollback()  # Never hand an open transaction to the next caller.
+        _last_used[id(conn)] = time.monotonic()
+        db_pool.putconn(conn)
+    except psycopg2.Error:
+        _last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+
+
+@contextmanager
+def db_connection():
+    """
+    Borrows a pooled connection for the duration of the block.
+    Yields None if the database is unreachable, mirroring the old
+    connect-per-call behaviour so tools can return a friendly error.
+    """
+    if not DB_URL:
+        yield None
+        return
+
+    _slots.acquire()
+    try:
+        try:
+            with telemetry.span("db", "checkout"):
+                db_pool = get_pool()
+                conn = _checkout(db_pool)
+        except Exception as e:
+            print(f"DB Pool Error: {e}")
+            yield None
+            return
+
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            _release(db_pool, conn, broken=broken)
+    finally:
+        _slots.release()
+
+
+def close_pool():
+    """Closes every pooled connection. Called on application shutdown."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
@@ -0,0 +1,82 @@
+import os
+import time
+import base64
+from googleapiclient.errors import HttpError
+import telemetry
+
+
+# Only what read_emails uses: Subject/From headers and the text/plain body.
+MESSAGE_FIELDS = "id,internalDate,payload(headers(name,value),mimeType,body/data,parts(mimeType,body/data))"
+# Gmail rejects batches over 100 calls and recommends staying at or below 50.
+BATCH_SIZE = 50
+# Items of a batch fail on their own (per-user rate limits answer 429 to part
+# of a batch); they get this many more batches, with exponential backoff.
+BATCH_RETRIES = int(os.getenv("GMAIL_BATCH_RETRIES", "2"))
+BATCH_RETRY_BACKOFF = float(os.getenv("GMAIL_BATCH_RETRY_BACKOFF", "0.5"))
+
+
+def _is_gone(exception):
+    return isinstance(exception, HttpError) and exception.resp.status == 404
+
+
+def fetch_messages(service, message_ids):
+    """
+    Fetches full messages in Gmail batch requests (one HTTP round trip per
+    BATCH_SIZE ids), retrying items that failed. Returns (messages in the
+    order of message_ids, ids that still failed). Messages deleted in the
+    meantime (404) are neither.
+    """
+    results = {}
+    failed = []
+
+    def on_response(request_id, response, exception):
+        if exception is None:
+            results[request_id] = response
+        elif not _is_gone(exception):
+            failed.append(request_id)
+
+    pending = list(message_ids)
+    for attempt in range(BATCH_RETRIES + 1):
+        if attempt:
+            time.sleep(BATCH_RETRY_BACKOFF * 2 ** (attempt - 1))
+        failed = []
+        for start in range(0, len(pending), BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=on_response)
+            for message_id in pending[start:start + BATCH_SIZE]:
+                request = service.users().messages().get(
+                    userId='me', id=message_id, format='full', fields=MESSAGE_FIELDS
+                )
+                batch.add(request, request_id=message_id)
+            with telemetry.span("google_api", "gmail.users.messages.batchGet"):
+                batch.execute()
+        pending = failed
+        if not pending:
+            break
+
+    if pending:
+        print(f"Gmail batch: {len(pending)} of {len(message_ids)} messages failed to load")
+    return [results[message_id] for message_id in message_ids if message_id in results], pending
+
+
+def parse_message(message):
+    """Returns (sender, subject, body) for a Gmail message; body is None if there is no plain text."""
+    payload = message.get('payload', {})
+    headers = payload.get('headers', [])
+
+    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
+    sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
+
+    body = None
+    if 'parts' in payload:
+        for part in payload['parts']:
+            if part.get('mimeType') == 'text/plain':
+                data = part.get('body', {}).get('data')
+                if data:
+                    body = base64.urlsafe_b64decode(data).decode()
+                break
+    elif 'body' in payload:
+        data = payload['body'].get('data')
+        if data:
+            body = base64.urlsafe_b64decode(data).decode()
+
+    return sender, subject, body
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import datetime
+import threading
+from collections import OrderedDict
+from db import DB_URL
+from sessions import current_user, load_credentials_data, save_credentials_data
+import telemetry
+
+
+# Single-user fallback used when no database is configured.
+TOKEN_PATH = os.getenv("GOOGLE_TOKEN_PATH", "token.json")
+CREDENTIALS_RECHECK_SECONDS = float(os.getenv("CREDENTIALS_RECHECK_SECONDS", "60"))
+# Built clients kept per worker thread, least recently used evicted first.
+GOOGLE_SERVICE_CACHE_SIZE = int(os.getenv("GOOGLE_SERVICE_CACHE_SIZE", "64"))
+
+# Guards the dicts below only; network and DB I/O happen under the per-user lock.
+_lock = threading.Lock()
+# Per-user work is serialized through a fixed set of lock stripes, so the
+# number of locks doesn't grow with every user ever seen.
+USER_LOCK_STRIPES = 64
+_user_locks = [threading.RLock() for _ in range(USER_LOCK_STRIPES)]
+# user -> {"creds": Credentials, "stamp", "checked_at": float, "saved_token": str}
+_credentials = {}
+# Bumped on every invalidation so per-thread service caches know to rebuild.
+_generation = 0
+# httplib2 (used under the hood by googleapiclient) is not thread-safe, so
+# built service objects are cached per thread while credentials are shared.
+_local = threading.local()
+_traced_request = None
+
+
+def _traced_request_class():
+    """
+    HttpRequest subclass that records every Google API call as a span named
+    after its method. Built on first use because googleapiclient is slow to import.
+    """
+    global _traced_request
+    if _traced_request is None:
+        from googleapiclient.http import HttpRequest
+
+        class TracedHttpRequest(HttpRequest):
+            def execute(self, http=None, num_retries=0):
+                with telemetry.span("google_api", self.methodId or "unknown"):
+                    return super().execute(http=http, num_retries=num_retries)
+
+        _traced_request = TracedHttpRequest
+    return _traced_request
+
+
+def _credentials_to_dict(creds):
+    return {
+        "token": creds.token,
+        "refresh_token": creds.refresh_token,
+        "token_uri": creds.token_uri,
+        "client_id": creds.client_id,
+        "client_secret": creds.client_secret,
+        "scopes": creds.scopes,
+        "expiry": creds.expiry.isoformat() if creds.expiry else None,
+    }
+
+
+def _credentials_from_dict(data):
+    from google.oauth2.credentials import Credentials
+    expiry = data.get("expiry")
+    return Credentials(
+        token=data["token"],
+        refresh_token=data["refresh_token"],
+        token_uri=data["token_uri"],
+        client_id=data["client_id"],
+        client_secret=data["client_secret"],
+        scopes=data["scopes"],
+        expiry=datetime.datetime.fromisoformat(expiry) if expiry else None,
+    )
+
+
+def _write_token_file(creds):
+    tmp_path = f"{TOKEN_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(_credentials_to_dict(creds), f)
+    os.replace(tmp_path, TOKEN_PATH)
+    return os.path.getmtime(TOKEN_PATH)
+
+
+def _read_stored(user):
+    """Returns (credential dict, change stamp) from Postgres per session, or token.json without a database."""
+    if DB_URL:
+        data = load_credentials_data(user)
+        return data, json.dumps(data, sort_keys=True) if data else None
+    try:
+        stamp = os.path.getmtime(TOKEN_PATH)
+    except OSError:
+        return None, None
+    with open(TOKEN_PATH, "r") as f:
+        return json.load(f), stamp
+
+
+def _store(user, creds):
+    """Writes the credentials and returns the change stamp _read_stored will report for them."""
+    if DB_URL:
+        data = _credentials_to_dict(creds)
+        save_credentials_data(user, data)
+        return json.dumps(data, sort_keys=True)
+    return _write_token_file(creds)
+
+
+def _user_lock(user):
+    return _user_locks[hash(user) % USER_LOCK_STRIPES]
+
+
+def save_credentials(creds, user=None):
+    """Persists freshly granted credentials and drops every cached client for the user."""
+    user = user or current_user()
+    with _user_lock(user):
+        _store(user, creds)
+        invalidate_google_clients(user)
+
+
+def invalidate_google_clients(user=None):
+    """Forgets cached credentials and services for one user, or for everyone."""
+    global _generation
+    with _lock:
+        if user is None:
+            _credentials.clear()
+        else:
+            _credentials.pop(user, None)
+        _generation += 1
+
+
+def get_credentials(user=None):
+    """
+    Returns cached Credentials for the user. The store is re-read at most every
+    CREDENTIALS_RECHECK_SECONDS so logins handled by other workers are noticed.
+    Tokens refreshed in memory are written back to the store.
+    """
+    user = user or current_user()
+    # One user's token refresh or slow credential read doesn't hold up anyone else.
+    with _user_lock(user):
+        with _lock:
+            entry = _credentials.get(user)
+        if entry is None or time.monotonic() - entry["checked_at"] > CREDENTIALS_RECHECK_SECONDS:
+            data, stamp = _read_stored(user)
+            if data is None:
+                with _lock:
+                    _credentials.pop(user, None)
+                return None
+            if entry is None or entry["stamp"] != stamp:
+                creds = _credentials_from_dict(data)
+                entry = {"creds": creds, "stamp": stamp, "saved_token": creds.token}
+                with _lock:
+                    _credentials[user] = entry
+            entry["checked_at"] = time.monotonic()
+
+        creds = entry["creds"]
+        if not creds.valid and creds.refresh_token:
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+
+        # Covers both the refresh above and refreshes done by the HTTP transport on a 401.
+        if creds.token != entry["saved_token"]:
+            entry["stamp"] = _store(user, creds)
+            entry["saved_token"] = creds.token
+        return creds
+
+
+def get_google_service(service_name, version, user=None):
+    """Returns a built Google API client for the user (default: current session), reusing it across tool calls."""
+    user = user or current_user()
+    creds = get_credentials(user)
+    if not creds:
+        return None
+
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = OrderedDict()
+
+    key = (user, service_name, version)
+    cached = services.get(key)
+    if cached and cached[0] == _generation and cached[1] is creds:
+        services.move_to_end(key)
+        return cached[2]
+
+    from googleapiclient.discovery import build
+    # static_discovery uses the discovery documents bundled with google-api-python-client.
+    service = build(service_name, version, credentials=creds,
+                    static_discovery=True, cache_discovery=False,
+                    requestBuilder=_traced_request_class())
+    services[key] = (_generation, creds, service)
+    services.move_to_end(key)
+    while len(services) > GOOGLE_SERVICE_CACHE_SIZE:
+        services.popitem(last=False)
+    return service
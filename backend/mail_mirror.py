@@ -0,0 +1,200 @@
+import os
+import time
+import sqlite3
+import threading
+from googleapiclient.errors import HttpError
+from gmail import fetch_messages, parse_message
+
+
+MAILBOX_DB_PATH = os.getenv("MAILBOX_DB_PATH", "mailbox.db")
+# How many recent messages a full sync mirrors.
+MAILBOX_SYNC_DEPTH = int(os.getenv("MAILBOX_SYNC_DEPTH", "200"))
+# Minimum seconds between two incremental syncs for the same user.
+MAILBOX_SYNC_INTERVAL = float(os.getenv("MAILBOX_SYNC_INTERVAL", "15"))
+BODY_LIMIT = 2000
+# Messages carrying these labels are not part of what messages.list returns.
+HIDDEN_LABELS = {'DRAFT', 'SPAM', 'TRASH'}
+
+# Syncs are serialized per user through a fixed set of lock stripes, so the
+# number of locks doesn't grow with every user ever seen.
+SYNC_LOCK_STRIPES = 64
+_user_locks = [threading.Lock() for _ in range(SYNC_LOCK_STRIPES)]
+_last_sync = {}
+_local = threading.local()
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(MAILBOX_DB_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                user TEXT NOT NULL,
+                id TEXT NOT NULL,
+                internal_date INTEGER NOT NULL,
+                sender TEXT,
+                subject TEXT,
+                body TEXT,
+                PRIMARY KEY (user, id)
+            );
+            CREATE INDEX IF NOT EXISTS messages_recent_idx ON messages (user, internal_date DESC);
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                sender, subject, body,
+                content='messages', content_rowid='rowid'
+            );
+            CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, sender, subject, body)
+                VALUES (new.rowid, new.sender, new.subject, new.body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, sender, subject, body)
+                VALUES ('delete', old.rowid, old.sender, old.subject, old.body);
+            END;
+            CREATE TABLE IF NOT EXISTS sync_state (
+                user TEXT PRIMARY KEY,
+                history_id TEXT NOT NULL
+            );
+        """)
+        _local.conn = conn
+    return conn
+
+
+def _store(conn, user, messages):
+    for message in messages:
+        sender, subject, body = parse_message(message)
+        conn.execute("DELETE FROM messages WHERE user = ? AND id = ?", (user, message['id']))
+        conn.execute(
+            "INSERT INTO messages (user, id, internal_date, sender, subject, body) VALUES (?, ?, ?, ?, ?, ?)",
+            (user, message['id'], int(message.get('internalDate', 0)), sender, subject,
+             body[:BODY_LIMIT] if body is not None else None)
+        )
+
+
+def _full_sync(service, conn, user):
+    # Read the history ID first so nothing that arrives during the sync is missed.
+    history_id = service.users().getProfile(userId='me').execute()['historyId']
+
+    message_ids = []
+    page_token = None
+    while len(message_ids) < MAILBOX_SYNC_DEPTH:
+        results = service.users().messages().list(
+            userId='me', maxResults=min(500, MAILBOX_SYNC_DEPTH - len(message_ids)), pageToken=page_token
+        ).execute()
+        message_ids.extend(msg['id'] for msg in results.get('messages', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+    messages, failed = fetch_messages(service, message_ids)
+    with conn:
+        conn.execute("DELETE FROM messages WHERE user = ?", (user,))
+        _store(conn, user, messages)
+        if failed:
+            # No sync state: the next sync starts over rather than miss these for good.
+            conn.execute("DELETE FROM sync_state WHERE user = ?", (user,))
+        else:
+            conn.execute("INSERT OR REPLACE INTO sync_state (user, history_id) VALUES (?, ?)", (user, history_id))
+
+
+def _visible(message):
+    return HIDDEN_LABELS.isdisjoint(message.get('labelIds', []))
+
+
+def _incremental_sync(service, conn, user, history_id):
+    # message id -> True if it should be in the mirror, as of its latest change.
+    changes = {}
+    page_token = None
+    while True:
+        results = service.users().history().list(
+            userId='me', startHistoryId=history_id, pageToken=page_token,
+            historyTypes=['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+        ).execute()
+        for record in results.get('history', []):
+            for item in record.get('messagesAdded', []):
+                changes[item['message']['id']] = _visible(item['message'])
+            for item in record.get('messagesDeleted', []):
+                changes[item['message']['id']] = False
+            for item in record.get('labelsAdded', []):
+                if not HIDDEN_LABELS.isdisjoint(item.get('labelIds', [])):
+                    changes[item['message']['id']] = False
+            # Restored from Trash/Spam: back in the mirror.
+            for item in record.get('labelsRemoved', []):
+                if not HIDDEN_LABELS.isdisjoint(item.get('labelIds', [])) and _visible(item['message']):
+                    changes[item['message']['id']] = True
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+    added = [message_id for message_id, visible in changes.items() if visible]
+    deleted = [message_id for message_id, visible in changes.items() if not visible]
+    messages, failed = fetch_messages(service, added) if added else ([], [])
+    with conn:
+        conn.executemany("DELETE FROM messages WHERE user = ? AND id = ?", [(user, i) for i in deleted])
+        _store(conn, user, messages)
+        # Keep the mirror bounded to the most recent MAILBOX_SYNC_DEPTH messages.
+        conn.execute("""
+            DELETE FROM messages WHERE user = ? AND id NOT IN (
+                SELECT id FROM messages WHERE user = ? ORDER BY internal_date DESC LIMIT ?
+            )
+        """, (user, user, MAILBOX_SYNC_DEPTH))
+        # Messages that failed to load are still missing, so keep the old
+        # history ID: the next sync replays this history and fetches them again.
+        if not failed:
+            conn.execute("UPDATE sync_state SET history_id = ? WHERE user = ?", (results['historyId'], user))
+
+
+def sync(service, user, force=False):
+    """
+    Brings the local mirror up to date with Gmail. Uses the history API from
+    the last stored historyId and falls back to a full resync only when
+    Gmail reports that history ID as expired.
+    """
+    with _user_locks[hash(user) % SYNC_LOCK_STRIPES]:
+        if not force and time.monotonic() - _last_sync.get(user, float("-inf")) < MAILBOX_SYNC_INTERVAL:
+            return
+        conn = _connect()
+        row = conn.execute("SELECT history_id FROM sync_state WHERE user = ?", (user,)).fetchone()
+        if row is None:
+            _full_sync(service, conn, user)
+        else:
+            try:
+                _incremental_sync(service, conn, user, row[0])
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                _full_sync(service, conn, user)
+        _last_sync[user] = time.monotonic()
+
+
+def version(user):
+    """The historyId the user's mirror is synced to (None before the first sync); changes with any mailbox change."""
+    row = _connect().execute("SELECT history_id FROM sync_state WHERE user = ?", (user,)).fetchone()
+    return row[0] if row else None
+
+
+def _fts_query(search_term):
+    # Quote each word so user input can't be parsed as FTS5 syntax.
+    words = [word.replace('"', '') for word in search_term.split()]
+    return " ".join(f'"{word}"' for word in words if word)
+
+
+def search(user, search_term="latest", limit=5):
+    """Returns up to `limit` (id, sender, subject, body) rows with a body, newest first."""
+    conn = _connect()
+    if search_term == "latest":
+        return conn.execute("""
+            SELECT id, sender, subject, body FROM messages
+            WHERE user = ? AND body IS NOT NULL
+            ORDER BY internal_date DESC LIMIT ?
+        """, (user, limit)).fetchall()
+
+    query = _fts_query(search_term)
+    if not query:
+        return []
+    return conn.execute("""
+        SELECT m.id, m.sender, m.subject, m.body FROM messages_fts
+        JOIN messages m ON m.rowid = messages_fts.rowid
+        WHERE messages_fts MATCH ? AND m.user = ? AND m.body IS NOT NULL
+        ORDER BY m.internal_date DESC LIMIT ?
+    """, (query, user, limit)).fetchall()
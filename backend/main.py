@@ -1,16 +1,43 @@
-from fastapi import FastAPI
+# Backend modules read their settings (DATABASE_URL, DB_*, ...) at import
+# time, so .env has to be loaded before any of them is imported.
+from dotenv import load_dotenv
+load_dotenv()
+
+from contextlib import asynccontextmanager
+import time
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.middleware.cors import CORSMiddleware 
 from auth import router as auth_router
-from agent import run_agent
 from pydantic import BaseModel
 import os
-from dotenv import load_dotenv
-from agent import run_agent, get_upcoming_events_list
+import json
+from agent import aget_dashboard, arun_agent, astream_agent, flush_memory, readiness, run_blocking, warm_up
+from db import close_pool
+from sessions import session_id_for
+from tool_cache import cache_stats
+import telemetry
+import response_cache
 
-load_dotenv()
+async def _warm_up_in_background():
+    try:
+        await run_blocking(warm_up)
+    except Exception as e:
+        print(f"Warm-up Error: {e}") # Components are retried lazily on first use.
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Gemini client, LangGraph agent and DB schema are built in the background,
+    # so /health answers as soon as uvicorn is listening.
+    app.state.warm_up = asyncio.create_task(_warm_up_in_background())
+    yield
+    # Write queued save_to_memory facts before the pool goes away.
+    flush_memory()
+    close_pool()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,26 +47,118 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY", "secret"))
+# Cross-site deployments (frontend and backend on different domains) need
+# SESSION_SAME_SITE=none and SESSION_HTTPS_ONLY=true for the cookie to reach /chat.
+app.add_middleware(
+    SessionMiddleware,
+    secret_key=os.getenv("SECRET_KEY", "secret"),
+    same_site=os.getenv("SESSION_SAME_SITE", "lax"),
+    https_only=os.getenv("SESSION_HTTPS_ONLY", "false").lower() == "true",
+)
 
 app.include_router(auth_router)
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Assigns a request ID (echoed as X-Request-ID) and records per-endpoint latency."""
+    request_id = telemetry.new_request_id(request.headers.get("x-request-id"))
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = route.path if route else "unmatched"
+        telemetry.observe_http(request.method, endpoint, status, time.perf_counter() - start)
+
 class ChatRequest(BaseModel):
     message: str
 
 @app.post("/chat")
-def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """Send a message to the AI Agent."""
-    response = run_agent(request.message)
+    response = await arun_agent(request.message, session_id_for(http_request))
     return {"response": response}
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """Same as /chat, streamed as Server-Sent Events: tool progress, then the answer token by token."""
+    session_id = session_id_for(http_request)
+
+    async def event_source():
+        async for event, data in astream_agent(request.message, session_id):
+            yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Seconds between the /next-event/stream checks for calendar changes.
+NEXT_EVENT_PUSH_INTERVAL = float(os.getenv("NEXT_EVENT_PUSH_INTERVAL", "30"))
+
+def _etag_matches(if_none_match, etag):
+    """If-None-Match uses weak comparison: W/ prefixes are ignored, '*' matches anything."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
 
 @app.get("/next-event")
-def get_next_event():
-    events = get_upcoming_events_list()
-    if not events:
-        return [] # Return empty list if nothing found
-    return events
+async def get_next_event(request: Request):
+    body, etag = await aget_dashboard(session_id_for(request))
+    # Per-user data: browsers may keep it but must revalidate, which costs a 304 while nothing changed.
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Cookie"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/next-event/stream")
+async def next_event_stream(request: Request):
+    """
+    Server-Sent Events: an 'events' message with the /next-event list now and
+    whenever it changes, keep-alive comments in between. The message ID is the
+    list's ETag, so a reconnecting client isn't sent a list it already has.
+    """
+    session_id = session_id_for(request)
+
+    async def event_source():
+        last_etag = request.headers.get("last-event-id")
+        while not await request.is_disconnected():
+            body, etag = await aget_dashboard(session_id)
+            if etag != last_etag:
+                last_etag = etag
+                yield f"event: events\nid: {etag}\ndata: {body.decode()}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(NEXT_EVENT_PUSH_INTERVAL)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/tool-cache/stats")
+def tool_cache_stats():
+    """Hit/miss counters for the agent's tool result cache."""
+    return cache_stats()
+
+@app.get("/response-cache/stats")
+def response_cache_stats():
+    """Hit rate and agent time saved by the chat response cache."""
+    return response_cache.stats()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint."""
+    body, content_type = telemetry.render_metrics()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/")
 def read_root():
@@ -49,5 +168,13 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+def ready_check():
+    """503 until background warm-up has built the agent and database schema."""
+    components = readiness()
+    ready = all(components.values())
+    return JSONResponse(status_code=200 if ready else 503,
+                        content={"status": "ready" if ready else "warming_up", "components": components})
+
 
 
@@ -0,0 +1,136 @@
+import os
+import math
+import time
+import zlib
+import threading
+from collections import OrderedDict
+from router import normalize
+
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+# Upper bound on reuse even when no tracked data changed ("next meeting" moves with the clock).
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# Short replies ("yes", "send it") only make sense in the context of the conversation.
+RESPONSE_CACHE_MIN_WORDS = int(os.getenv("RESPONSE_CACHE_MIN_WORDS", "3"))
+# Words that point back at the conversation ("reply to him", "move that one
+# instead"): a message using them is a follow-up and never cached.
+FOLLOW_UP_WORDS = {"it", "its", "that", "this", "these", "those", "them", "they", "he", "him", "his",
+                   "she", "her", "one", "ones", "again", "also", "instead", "same", "above", "previous",
+                   "earlier", "yes", "no", "ok", "okay", "sure", "then"}
+# Similarity tier: reuse an answer to a differently worded but near-identical question.
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "false").lower() == "true"
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.9"))
+
+# Words that carry no meaning for matching questions against each other.
+STOP_WORDS = {"a", "an", "the", "is", "are", "am", "do", "does", "i", "me", "my", "you", "your",
+              "please", "can", "could", "would", "to", "of", "for", "in", "on", "and", "what", "whats"}
+_BUCKETS = 1024
+
+_lock = threading.Lock()
+# (user, normalized text) -> {"answer", "cost", "expires_at", "vector", "sources", "stamps"}
+_entries = OrderedDict()
+_stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "seconds_saved": 0.0}
+
+
+def cacheable(text):
+    """True for standalone questions; short replies and follow-ups depend on the conversation."""
+    words = normalize(text).split()
+    return (RESPONSE_CACHE_ENABLED and len(words) >= RESPONSE_CACHE_MIN_WORDS
+            and not FOLLOW_UP_WORDS.intersection(words))
+
+
+def _vector(normalized):
+    """A hashed bag of words and word pairs, L2-normalized, as {bucket: weight}."""
+    words = [word for word in normalized.split() if word not in STOP_WORDS]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vector = {}
+    for feature in features:
+        bucket = zlib.crc32(feature.encode()) % _BUCKETS
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {bucket: weight / norm for bucket, weight in vector.items()} if norm else {}
+
+
+def _similarity(a, b):
+    return sum(weight * b.get(bucket, 0.0) for bucket, weight in a.items())
+
+
+def _most_similar(user, normalized, now):
+    vector = _vector(normalized)
+    best_key, best_score = None, RESPONSE_CACHE_SIMILARITY
+    for key, entry in _entries.items():
+        if key[0] != user or entry["expires_at"] <= now:
+            continue
+        score = _similarity(vector, entry["vector"])
+        if score >= best_score:
+            best_key, best_score = key, score
+    return best_key
+
+
+def get(user, text, stamps_for):
+    """
+    Returns a cached answer to this user's question, or None. stamps_for(sources)
+    reads the current versions of the data sources an entry's answer was built
+    from; an entry only matches if they are unchanged since it was stored.
+    """
+    if not cacheable(text):
+        return None
+    normalized = normalize(text)
+    now = time.monotonic()
+    with _lock:
+        key, tier = (user, normalized), "exact"
+        entry = _entries.get(key)
+        if (entry is None or entry["expires_at"] <= now) and RESPONSE_CACHE_SEMANTIC:
+            key, tier = _most_similar(user, normalized, now), "semantic"
+            entry = _entries.get(key)
+        if entry is not None and entry["expires_at"] <= now:
+            entry = None
+
+    # Reading the stamps may sync a source, so it runs outside the lock.
+    if entry is not None and stamps_for(entry["sources"]) == entry["stamps"]:
+        with _lock:
+            if key in _entries:
+                _entries.move_to_end(key)
+            _stats[f"{tier}_hits"] += 1
+            _stats["seconds_saved"] += entry["cost"]
+        return entry["answer"]
+
+    with _lock:
+        _stats["misses"] += 1
+    return None
+
+
+def put(user, text, sources, stamps, answer, cost):
+    """
+    Stores an answer that took `cost` seconds to produce from `sources`,
+    under their stamps as read before the turn started.
+    """
+    if not cacheable(text) or stamps is None or not answer:
+        return
+    normalized = normalize(text)
+    with _lock:
+        key = (user, normalized)
+        _entries[key] = {
+            "answer": answer,
+            "cost": cost,
+            "expires_at": time.monotonic() + RESPONSE_CACHE_TTL,
+            "vector": _vector(normalized) if RESPONSE_CACHE_SEMANTIC else {},
+            "sources": sources,
+            "stamps": stamps,
+        }
+        _entries.move_to_end(key)
+        _stats["stores"] += 1
+        while len(_entries) > RESPONSE_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def stats():
+    """Hits per tier, misses, hit rate and the agent time the hits avoided."""
+    with _lock:
+        result = dict(_stats, entries=len(_entries))
+    hits = result["exact_hits"] + result["semantic_hits"]
+    lookups = hits + result["misses"]
+    result["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+    result["seconds_saved"] = round(result["seconds_saved"], 3)
+    return result
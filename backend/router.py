@@ -0,0 +1,49 @@
+import os
+import re
+
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+
+# Whole-message patterns only: anything with extra detail ("...and email Joel",
+# "next meeting with Sam") doesn't match and goes to the full agent.
+INTENT_PATTERNS = {
+    "next_event": [
+        r"(what|when) ?(is|s)? my next (meeting|event|appointment|call)",
+        r"(show|tell) me my next (meeting|event|appointment|call)",
+        r"(my )?next (meeting|event|appointment|call)",
+    ],
+    "memory_dump": [
+        r"what do you (know|remember) about me",
+        r"what have you (saved|stored|remembered) about me",
+        r"(show|list) (me )?(my|your) (memory|memories)",
+    ],
+    "latest_emails": [
+        r"((show|read|check|get|list) )?(me )?my (latest|recent|new|last) (emails|mails|messages)",
+        r"(show|read|check) (me )?my (inbox|emails|mail)",
+        r"(latest|recent) (emails|mails)",
+        r"(whats|what is) in my inbox",
+    ],
+}
+
+_COMPILED = {
+    intent: [re.compile(f"^(please )?{pattern}( please)?$") for pattern in patterns]
+    for intent, patterns in INTENT_PATTERNS.items()
+}
+
+
+def normalize(text):
+    """Lowercases, drops punctuation/apostrophes and collapses whitespace."""
+    text = text.lower().replace("'", "").replace("’", "")
+    text = re.sub(r"[^a-z0-9 ]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def classify(text):
+    """Returns the fast-path intent for a message, or None if the full agent should handle it."""
+    if not ROUTER_ENABLED:
+        return None
+    normalized = normalize(text)
+    for intent, patterns in _COMPILED.items():
+        if any(pattern.match(normalized) for pattern in patterns):
+            return intent
+    return None
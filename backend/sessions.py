@@ -0,0 +1,193 @@
+import os
+import uuid
+import threading
+import contextvars
+from collections import OrderedDict
+from psycopg2.extras import Json
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from db import DB_URL, db_connection
+
+
+# Used when there is no request session (scripts, single-user local runs).
+DEFAULT_USER = "default"
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+
+# The session the current agent turn / request belongs to. Tools read it to
+# pick the right credentials, mailbox mirror and calendar store.
+_current_user = contextvars.ContextVar("current_user", default=DEFAULT_USER)
+
+_lock = threading.RLock()
+# session_id -> {"messages": [...], "summary": str, "version": int}
+_conversations = OrderedDict()
+
+
+def session_id_for(request):
+    """Returns the caller's session ID, assigning one on first contact."""
+    sid = request.session.get("sid")
+    if not sid:
+        sid = request.session["sid"] = uuid.uuid4().hex
+    return sid
+
+
+def current_user():
+    return _current_user.get()
+
+
+def set_current_user(user):
+    """Binds the user for the rest of this context; returns a token for reset_current_user."""
+    return _current_user.set(user)
+
+
+def reset_current_user(token):
+    _current_user.reset(token)
+
+
+def init_session_tables():
+    """Creates the tables backing per-session conversations and OAuth credentials. Returns True on success."""
+    with db_connection() as conn:
+        if not conn: return False
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    session_id TEXT PRIMARY KEY,
+                    messages JSONB NOT NULL,
+                    summary TEXT NOT NULL DEFAULT '',
+                    version INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                CREATE TABLE IF NOT EXISTS oauth_credentials (
+                    session_id TEXT PRIMARY KEY,
+                    data JSONB NOT NULL,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+            """)
+            conn.commit()
+            cur.close()
+            return True
+        except Exception as e:
+            print(f"Init Session Tables Error: {e}")
+            return False
+
+
+def _remember(session_id, entry):
+    with _lock:
+        _conversations[session_id] = entry
+        _conversations.move_to_end(session_id)
+        while len(_conversations) > SESSION_CACHE_SIZE:
+            _conversations.popitem(last=False)
+
+
+def load_conversation(session_id):
+    """
+    Returns {"messages", "summary", "version"} for the session. The in-process
+    LRU copy is reused as long as its version still matches Postgres, so
+    another worker's newer turn is always picked up.
+    """
+    with _lock:
+        cached = _conversations.get(session_id)
+        if cached is not None:
+            _conversations.move_to_end(session_id)
+
+    with db_connection() as conn:
+        if not conn:
+            # No database: the process-local cache is the store.
+            if cached is None:
+                cached = {"messages": [], "summary": "", "version": 0}
+                _remember(session_id, cached)
+            return {**cached, "messages": list(cached["messages"])}
+
+        cur = conn.cursor()
+        cur.execute("SELECT version FROM conversations WHERE session_id = %s", (session_id,))
+        row = cur.fetchone()
+        version = row[0] if row else 0
+        if cached is None or cached["version"] != version:
+            if row:
+                cur.execute("SELECT messages, summary FROM conversations WHERE session_id = %s", (session_id,))
+                messages, summary = cur.fetchone()
+                cached = {"messages": messages_from_dict(messages), "summary": summary, "version": version}
+            else:
+                cached = {"messages": [], "summary": "", "version": 0}
+            _remember(session_id, cached)
+        cur.close()
+    return {**cached, "messages": list(cached["messages"])}
+
+
+def save_conversation(session_id, messages, summary, expected_version=None):
+    """
+    Persists the session's conversation and refreshes the LRU copy. Returns
+    the new version. With expected_version, the save only happens if nobody
+    saved the session since that version; otherwise it returns None.
+    """
+    with db_connection() as conn:
+        if not conn:
+            with _lock:
+                current = (_conversations.get(session_id) or {}).get("version", 0)
+                if expected_version is not None and current != expected_version:
+                    return None
+                version = current + 1
+                _remember(session_id, {"messages": list(messages), "summary": summary, "version": version})
+            return version
+
+        cur = conn.cursor()
+        if expected_version == 0:
+            cur.execute("""
+                INSERT INTO conversations (session_id, messages, summary, version, updated_at)
+                VALUES (%s, %s, %s, 1, now())
+                ON CONFLICT (session_id) DO NOTHING
+                RETURNING version;
+            """, (session_id, Json(messages_to_dict(messages)), summary))
+        elif expected_version is None:
+            cur.execute("""
+                INSERT INTO conversations (session_id, messages, summary, version, updated_at)
+                VALUES (%s, %s, %s, 1, now())
+                ON CONFLICT (session_id) DO UPDATE SET
+                    messages = EXCLUDED.messages,
+                    summary = EXCLUDED.summary,
+                    version = conversations.version + 1,
+                    updated_at = now()
+                RETURNING version;
+            """, (session_id, Json(messages_to_dict(messages)), summary))
+        else:
+            cur.execute("""
+                UPDATE conversations SET
+                    messages = %s, summary = %s, version = version + 1, updated_at = now()
+                WHERE session_id = %s AND version = %s
+                RETURNING version;
+            """, (Json(messages_to_dict(messages)), summary, session_id, expected_version))
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+    if row is None:
+        return None
+    _remember(session_id, {"messages": list(messages), "summary": summary, "version": row[0]})
+    return row[0]
+
+
+def clear_conversation(session_id):
+    """Forgets the session's chat history and summary."""
+    save_conversation(session_id, [], "")
+
+
+def load_credentials_data(session_id):
+    """Returns the stored OAuth credential dict for the session, or None."""
+    with db_connection() as conn:
+        if not conn: return None
+        cur = conn.cursor()
+        cur.execute("SELECT data FROM oauth_credentials WHERE session_id = %s", (session_id,))
+        row = cur.fetchone()
+        cur.close()
+        return row[0] if row else None
+
+
+def save_credentials_data(session_id, data):
+    with db_connection() as conn:
+        if not conn: return
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO oauth_credentials (session_id, data, updated_at)
+            VALUES (%s, %s, now())
+            ON CONFLICT (session_id) DO UPDATE SET data = EXCLUDED.data, updated_at = now();
+        """, (session_id, Json(data)))
+        conn.commit()
+        cur.close()
@@ -0,0 +1,94 @@
+import os
+import asyncio
+import threading
+
+
+# Concurrent callers asking for the same upstream resource share one fetch.
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+_lock = threading.Lock()
+# key -> _Call for fetches running on worker threads
+_calls = {}
+# key -> asyncio.Task for fetches awaited on the event loop
+_tasks = {}
+_stats = {}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _count(key, field):
+    counters = _stats.setdefault(key[0], {"fetches": 0, "shared": 0})
+    counters[field] += 1
+
+
+def do(key, fetch, timeout=None):
+    """
+    Runs fetch() for the first caller with this key; callers arriving while it
+    is in flight block on it and get the same result or exception. A waiter
+    that gives up after `timeout` seconds gets TimeoutError without disturbing
+    the others. key[0] names the resource kind in stats().
+    """
+    if not SINGLEFLIGHT_ENABLED:
+        return fetch()
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+        _count(key, "fetches" if leader else "shared")
+
+    if not leader:
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for shared fetch of {key[0]}")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = fetch()
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        # Forget the call before waking the waiters, so the next caller after
+        # a failure retries instead of inheriting the error.
+        with _lock:
+            del _calls[key]
+        call.done.set()
+
+
+def _forget(key, task):
+    if _tasks.get(key) is task:
+        del _tasks[key]
+    # Mark the exception as retrieved even if every waiter was cancelled.
+    if not task.cancelled():
+        task.exception()
+
+
+async def ado(key, fetch):
+    """
+    Async counterpart of do(): the first caller starts fetch() as a task and
+    everyone with the same key awaits it. A cancelled waiter (say, a client
+    that disconnected) stops waiting but leaves the shared fetch running.
+    """
+    if not SINGLEFLIGHT_ENABLED:
+        return await fetch()
+    task = _tasks.get(key)
+    with _lock:
+        _count(key, "shared" if task is not None else "fetches")
+    if task is None:
+        task = _tasks[key] = asyncio.ensure_future(fetch())
+        task.add_done_callback(lambda finished: _forget(key, finished))
+    return await asyncio.shield(task)
+
+
+def stats():
+    """Upstream fetches started and callers that shared an in-flight one, per resource kind."""
+    with _lock:
+        return {kind: dict(counters) for kind, counters in _stats.items()}
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import uuid
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager, nullcontext
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+
+# Prometheus histograms/counters behind /metrics.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# One JSON log line per span (request ID, kind, name, duration, error).
+TRACE_LOG_ENABLED = os.getenv("TRACE_LOG_ENABLED", "false").lower() == "true"
+ENABLED = METRICS_ENABLED or TRACE_LOG_ENABLED
+
+logger = logging.getLogger("sentient.trace")
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+HTTP_SECONDS = Histogram("sentient_http_request_seconds", "HTTP request latency",
+                         ["method", "endpoint", "status"], buckets=_BUCKETS)
+SPAN_SECONDS = {
+    "llm": Histogram("sentient_llm_seconds", "Gemini call latency", ["name"], buckets=_BUCKETS),
+    "tool": Histogram("sentient_tool_seconds", "Agent tool latency", ["name"], buckets=_BUCKETS),
+    "google_api": Histogram("sentient_google_api_seconds", "Google API request latency", ["name"], buckets=_BUCKETS),
+    "db": Histogram("sentient_db_seconds", "Postgres query latency", ["name"], buckets=_BUCKETS),
+}
+PROMPT_TOKENS = Counter("sentient_llm_prompt_tokens_total", "Prompt tokens sent to Gemini")
+COMPLETION_TOKENS = Counter("sentient_llm_completion_tokens_total", "Completion tokens returned by Gemini")
+
+
+def new_request_id(incoming=None):
+    """Binds a request ID (the caller's X-Request-ID if given) to the current context."""
+    request_id = incoming or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    return request_id
+
+
+def _record(kind, name, duration, error=None):
+    if METRICS_ENABLED:
+        SPAN_SECONDS[kind].labels(name=name).observe(duration)
+    if TRACE_LOG_ENABLED:
+        logger.info(json.dumps({
+            "request_id": request_id_var.get(), "kind": kind, "name": name,
+            "duration_ms": round(duration * 1000, 2), "error": error,
+        }))
+
+
+@contextmanager
+def _span(kind, name):
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _record(kind, name, time.perf_counter() - start, error)
+
+
+def span(kind, name):
+    """Times a block as an llm/tool/google_api/db span; a no-op when telemetry is off."""
+    if not ENABLED:
+        return nullcontext()
+    return _span(kind, name)
+
+
+def traced_tool(func):
+    """Wraps a tool function in a 'tool' span named after it."""
+    if not ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _span("tool", func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def observe_http(method, endpoint, status, duration):
+    if METRICS_ENABLED:
+        HTTP_SECONDS.labels(method=method, endpoint=endpoint, status=str(status)).observe(duration)
+
+
+class LLMTelemetryHandler(BaseCallbackHandler):
+    """LangChain callback that times every chat model call and counts its tokens."""
+
+    def __init__(self):
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._started.pop(run_id, None)
+        if start is not None:
+            _record("llm", "chat", time.perf_counter() - start)
+        if not METRICS_ENABLED:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    PROMPT_TOKENS.inc(usage.get("input_tokens", 0))
+                    COMPLETION_TOKENS.inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        start = self._started.pop(run_id, None)
+        if start is not None:
+            _record("llm", "chat", time.perf_counter() - start, type(error).__name__)
+
+
+def llm_config():
+    """RunnableConfig for agent/LLM calls: telemetry callback plus the request ID as metadata."""
+    if not ENABLED:
+        return {}
+    return {"callbacks": [LLMTelemetryHandler()], "metadata": {"request_id": request_id_var.get()}}
+
+
+def render_metrics():
+    """Returns (body, content type) in the Prometheus text exposition format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# The backend modules read their configuration at import time. An empty
+# DATABASE_URL also keeps main's load_dotenv() from pulling in a real
+# database from .env.
+os.environ["DATABASE_URL"] = ""
+os.environ.setdefault("GOOGLE_API_KEY", "offline-tests")
+os.environ["MAILBOX_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="sentient-tests-"), "mailbox.db")
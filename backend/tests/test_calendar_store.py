@@ -0,0 +1,83 @@
+import datetime
+
+import pytest
+
+import calendar_store
+from benchmarks.fakes import FakeCalendar
+
+
+@pytest.fixture
+def service():
+    return FakeCalendar(size=5, latency=0)
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _titles(user):
+    return {event["summary"] for event in calendar_store.upcoming(user, _now() - datetime.timedelta(days=30), limit=None)}
+
+
+def test_sync_stops_at_the_horizon(service):
+    user = "calendar-horizon"
+    service.external_change("Next year", begins=_now() + datetime.timedelta(days=365))
+    calendar_store.sync(service, user, force=True)
+    assert "Next year" not in _titles(user)
+    assert "Meeting 0" in _titles(user)
+
+    # Incremental changes past the window are dropped too.
+    service.external_change("Also next year", begins=_now() + datetime.timedelta(days=366))
+    calendar_store.sync(service, user, force=True)
+    assert "Also next year" not in _titles(user)
+
+
+def test_ended_events_are_pruned(service, monkeypatch):
+    user = "calendar-prune"
+    service.external_change("Earlier today", begins=_now() - datetime.timedelta(hours=3))
+    calendar_store.sync(service, user, force=True)
+    assert "Earlier today" in _titles(user)
+
+    monkeypatch.setattr(calendar_store, "CALENDAR_SYNC_LOOKBACK", datetime.timedelta(0))
+    calendar_store.sync(service, user, force=True)
+    assert "Earlier today" not in _titles(user)
+    assert "Meeting 0" in _titles(user)
+
+
+def test_window_moves_forward_with_a_full_sync(service):
+    user = "calendar-window"
+    calendar_store.sync(service, user, force=True)
+    service.external_change("In 60 days", begins=_now() + datetime.timedelta(days=60))
+    store = calendar_store._store_for(user)
+    store["events"].clear()
+    # Less than half the horizon left: the next sync lists the window afresh.
+    store["window_end"] = _now() + datetime.timedelta(days=1)
+
+    calendar_store.sync(service, user, force=True)
+    assert store["window_end"] > _now() + calendar_store.CALENDAR_SYNC_HORIZON / 2
+    assert {"Meeting 0", "In 60 days"} <= _titles(user)
+
+
+def test_upcoming_reflects_changes_after_sorting(service):
+    user = "calendar-order"
+    calendar_store.sync(service, user, force=True)
+    assert calendar_store.upcoming(user, _now(), limit=1)[0]["summary"] == "Meeting 0"
+
+    service.external_change("Sooner", begins=_now() + datetime.timedelta(minutes=5))
+    calendar_store.sync(service, user, force=True)
+    assert calendar_store.upcoming(user, _now(), limit=1)[0]["summary"] == "Sooner"
+
+
+def test_stores_are_evicted_least_recently_used_first(service, monkeypatch):
+    monkeypatch.setattr(calendar_store, "CALENDAR_STORE_SIZE", 2)
+    calendar_store.sync(service, "lru-a", force=True)
+    old_version = calendar_store.version("lru-a")
+    calendar_store._store_for("lru-b")
+    calendar_store._store_for("lru-a")
+    calendar_store._store_for("lru-c")
+
+    assert "lru-b" not in calendar_store._stores
+    assert "lru-a" in calendar_store._stores
+    calendar_store._stores.pop("lru-a")
+    # A store rebuilt after eviction never reuses an old version.
+    assert calendar_store.version("lru-a") != old_version
@@ -0,0 +1,41 @@
+import gmail
+from benchmarks.fakes import FakeGmail
+
+
+def test_fetch_messages_is_one_batch_in_request_order():
+    service = FakeGmail(size=30, latency=0)
+    # Oldest first, interleaved, to show the order comes from the ids and not the mailbox.
+    ids = [message["id"] for message in service.mailbox[:20]][::-2]
+
+    messages, failed = gmail.fetch_messages(service, ids)
+
+    assert [message["id"] for message in messages] == ids
+    assert failed == []
+    assert service.hits["batch"] == 1
+    assert service.hits["messages.get"] == 0
+
+
+def test_fetch_messages_splits_at_batch_size(monkeypatch):
+    monkeypatch.setattr(gmail, "BATCH_SIZE", 4)
+    service = FakeGmail(size=30, latency=0)
+    ids = [message["id"] for message in service.mailbox[:10]]
+
+    messages, _ = gmail.fetch_messages(service, ids)
+    assert [message["id"] for message in messages] == ids
+    assert service.hits["batch"] == 3
+
+
+def test_fetch_messages_retries_throttled_items(monkeypatch):
+    monkeypatch.setattr(gmail, "BATCH_RETRY_BACKOFF", 0)
+    service = FakeGmail(size=10, latency=0)
+    ids = [message["id"] for message in service.mailbox]
+    service.fail(ids[3], 429)
+    service.fail(ids[5], 429, 429, 429)
+    service.fail(ids[7], 404)
+
+    messages, failed = gmail.fetch_messages(service, ids)
+
+    # ids[3] loads on the retry, ids[5] is throttled every time, ids[7] is gone.
+    assert [message["id"] for message in messages] == [i for i in ids if i not in (ids[5], ids[7])]
+    assert failed == [ids[5]]
+    assert service.hits["batch"] == 1 + gmail.BATCH_RETRIES
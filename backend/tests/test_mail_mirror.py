@@ -0,0 +1,59 @@
+import pytest
+
+import gmail
+import mail_mirror
+from benchmarks.fakes import FakeGmail
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(gmail, "BATCH_RETRY_BACKOFF", 0)
+    return FakeGmail(size=20, latency=0)
+
+
+def _mirrored(user):
+    return {row[0] for row in mail_mirror.search(user, "latest", limit=100)}
+
+
+def test_message_restored_from_trash_comes_back(service):
+    user = "mirror-restore"
+    mail_mirror.sync(service, user, force=True)
+    message_id = service.mailbox[0]["id"]
+    assert message_id in _mirrored(user)
+
+    service.relabel(message_id, add=["TRASH"])
+    mail_mirror.sync(service, user, force=True)
+    assert message_id not in _mirrored(user)
+
+    service.relabel(message_id, remove=["TRASH"])
+    mail_mirror.sync(service, user, force=True)
+    assert message_id in _mirrored(user)
+
+
+def test_failed_fetch_keeps_history_id_until_the_message_loads(service):
+    user = "mirror-throttled"
+    mail_mirror.sync(service, user, force=True)
+    synced_to = mail_mirror.version(user)
+
+    message_id = service.deliver("Quarterly numbers")
+    service.fail(message_id, *[429] * (gmail.BATCH_RETRIES + 1))
+    mail_mirror.sync(service, user, force=True)
+    assert message_id not in _mirrored(user)
+    assert mail_mirror.version(user) == synced_to
+
+    # The next sync replays the same history and picks the message up.
+    mail_mirror.sync(service, user, force=True)
+    assert message_id in _mirrored(user)
+    assert mail_mirror.version(user) == str(service.history_id)
+
+
+def test_failed_full_sync_starts_over(service):
+    user = "mirror-full"
+    message_id = service.mailbox[0]["id"]
+    service.fail(message_id, *[503] * (gmail.BATCH_RETRIES + 1))
+    mail_mirror.sync(service, user, force=True)
+    assert mail_mirror.version(user) is None
+
+    mail_mirror.sync(service, user, force=True)
+    assert message_id in _mirrored(user)
+    assert mail_mirror.version(user) == str(service.history_id)
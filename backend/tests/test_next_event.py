@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import pytest
+
+import agent
+import calendar_store
+import main
+from benchmarks.fakes import FakeCalendar
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    calendar = FakeCalendar(size=5, latency=0)
+    monkeypatch.setattr(agent, "get_google_service", lambda service_name, version, user=None: calendar)
+    return calendar
+
+
+def _in_session(test):
+    """Runs `await test(client)` with an HTTP client that keeps one session cookie."""
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            await test(client)
+    asyncio.run(run())
+
+
+def test_matching_if_none_match_gets_empty_304(calendar):
+    async def test(client):
+        first = await client.get("/next-event")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+
+        revalidated = await client.get("/next-event", headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+
+    _in_session(test)
+
+
+def test_etag_changes_after_calendar_changes(calendar, monkeypatch):
+    monkeypatch.setattr(calendar_store, "CALENDAR_SYNC_INTERVAL", 0)
+
+    async def test(client):
+        before = await client.get("/next-event")
+        calendar.external_change("Added elsewhere")
+        after = await client.get("/next-event", headers={"If-None-Match": before.headers["etag"]})
+
+        assert after.status_code == 200
+        assert after.headers["etag"] != before.headers["etag"]
+        assert "Added elsewhere" in after.text
+
+    _in_session(test)
+
+
+def test_no_calendar_calls_within_sync_interval(calendar, monkeypatch):
+    monkeypatch.setattr(calendar_store, "CALENDAR_SYNC_INTERVAL", 60)
+
+    async def test(client):
+        for _ in range(4):
+            assert (await client.get("/next-event")).status_code == 200
+
+    _in_session(test)
+    # The first poll's full sync is the only upstream call.
+    assert calendar.hits["events.list"] == 1
+
+
+def test_dashboards_are_bounded(calendar, monkeypatch):
+    monkeypatch.setattr(agent, "DASHBOARD_CACHE_SIZE", 2)
+    for user in ("dash-a", "dash-b", "dash-c"):
+        agent.get_dashboard(user)
+    assert list(agent._dashboards)[-2:] == ["dash-b", "dash-c"]
+    assert len(agent._dashboards) <= 2
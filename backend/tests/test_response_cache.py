@@ -0,0 +1,53 @@
+import pytest
+
+import agent
+import calendar_store
+import response_cache
+from benchmarks.fakes import FakeCalendar, ScriptedChatModel
+
+QUESTION = "Am I free for lunch tomorrow?"
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    calendar = FakeCalendar(size=5, latency=0)
+    monkeypatch.setattr(agent, "get_google_service", lambda service_name, version, user=None: calendar)
+    return calendar
+
+
+@pytest.fixture
+def model(calendar, monkeypatch):
+    monkeypatch.setattr(agent, "_llm", agent._llm)
+    monkeypatch.setattr(agent, "_agent_executor", agent._agent_executor)
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_ENABLED", True)
+    model = ScriptedChatModel(latency=0, tool_plan=[{"name": "list_events", "args": {}}],
+                              final_answer="You're free after 2 PM tomorrow.")
+    agent.set_llm(model)
+    return model
+
+
+def test_second_consecutive_ask_hits(model):
+    first = agent.run_agent(QUESTION, "cache-s1")
+    calls = len(model.prompt_tokens)
+    # A real model rarely words its answer the same way twice.
+    model.final_answer = "Tomorrow is open from 2 PM."
+
+    assert agent.run_agent(QUESTION, "cache-s1") == first
+    assert agent.run_agent(QUESTION, "cache-s1") == first
+    assert len(model.prompt_tokens) == calls
+
+
+def test_calendar_change_misses(model, calendar, monkeypatch):
+    monkeypatch.setattr(calendar_store, "CALENDAR_SYNC_INTERVAL", 0)
+    agent.run_agent(QUESTION, "cache-s2")
+    model.final_answer = "Lunch tomorrow clashes with a new meeting."
+    calendar.external_change("Lunch with Sam")
+
+    assert agent.run_agent(QUESTION, "cache-s2") == "Lunch tomorrow clashes with a new meeting."
+
+
+def test_follow_ups_are_not_cacheable():
+    assert response_cache.cacheable(QUESTION)
+    assert not response_cache.cacheable("Send it to him please")
+    assert not response_cache.cacheable("Move that one to Friday")
+    assert not response_cache.cacheable("yes")
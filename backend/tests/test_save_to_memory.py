@@ -0,0 +1,33 @@
+import pytest
+
+import agent
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(agent, "DB_URL", "postgresql://unused")
+    monkeypatch.setattr(agent, "_schedule_flush", lambda: None)
+    flushed = []
+
+    def flush():
+        flushed.append(dict(agent._pending_memory))
+        agent._pending_memory.clear()
+
+    monkeypatch.setattr(agent, "flush_memory", flush)
+    yield flushed
+    agent._pending_memory.clear()
+
+
+def test_deferred_write_says_queued(queue, monkeypatch):
+    monkeypatch.setattr(agent, "MEMORY_WRITE_BEHIND", True)
+    result = agent.save_to_memory("editor", "vim")
+    assert result.startswith("Memory queued")
+    assert "Saved to DB" not in result
+    assert queue == []
+
+
+def test_synchronous_write_says_saved(queue, monkeypatch):
+    monkeypatch.setattr(agent, "MEMORY_WRITE_BEHIND", False)
+    result = agent.save_to_memory("editor", "vim")
+    assert result.startswith("Memory updated (Saved to DB)")
+    assert len(queue) == 1
@@ -0,0 +1,87 @@
+import time
+import threading
+
+import pytest
+
+import singleflight
+from benchmarks.fakes import FakeCalendar
+
+WAITERS = 8
+
+
+def _run_concurrently(key, fetch):
+    """
+    Calls singleflight.do(key, fetch) from WAITERS threads. fetch is held
+    until every other thread is waiting on it, so they all share one call.
+    Returns each thread's result or exception.
+    """
+    gate = threading.Event()
+    outcomes = [None] * WAITERS
+
+    def gated_fetch():
+        gate.wait(5)
+        return fetch()
+
+    def call(i):
+        try:
+            outcomes[i] = singleflight.do(key, gated_fetch)
+        except Exception as e:
+            outcomes[i] = e
+
+    shared_before = singleflight.stats().get(key[0], {}).get("shared", 0)
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(WAITERS)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while singleflight.stats().get(key[0], {}).get("shared", 0) - shared_before < WAITERS - 1:
+        assert time.monotonic() < deadline, "callers never joined the in-flight fetch"
+        time.sleep(0.001)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_concurrent_callers_share_one_upstream_call():
+    calendar = FakeCalendar(size=5, latency=0.01)
+
+    outcomes = _run_concurrently(("events.list", "alice"),
+                                 lambda: calendar.events().list(calendarId="primary").execute())
+
+    assert calendar.hits["events.list"] == 1
+    assert all(outcome is outcomes[0] for outcome in outcomes)
+    assert len(outcomes[0]["items"]) == 5
+
+
+def test_error_reaches_every_waiter_and_next_call_retries():
+    calendar = FakeCalendar(size=5, latency=0.01)
+    error = RuntimeError("calendar unavailable")
+
+    def failing_fetch():
+        calendar.events().list(calendarId="primary").execute()
+        raise error
+
+    outcomes = _run_concurrently(("events.list", "bob"), failing_fetch)
+
+    assert calendar.hits["events.list"] == 1
+    assert all(outcome is error for outcome in outcomes)
+
+    # The failed call is forgotten, so the next caller fetches again.
+    result = singleflight.do(("events.list", "bob"), lambda: calendar.events().list(calendarId="primary").execute())
+    assert calendar.hits["events.list"] == 2
+    assert len(result["items"]) == 5
+
+
+def test_waiter_timeout_leaves_the_fetch_running():
+    release = threading.Event()
+    leader = threading.Thread(target=singleflight.do, args=(("slow", "carol"), lambda: release.wait(5)))
+    leader.start()
+    while ("slow", "carol") not in singleflight._calls:
+        time.sleep(0.001)
+
+    with pytest.raises(TimeoutError):
+        singleflight.do(("slow", "carol"), lambda: None, timeout=0.01)
+
+    release.set()
+    leader.join(5)
+    assert ("slow", "carol") not in singleflight._calls
@@ -0,0 +1,36 @@
+import tool_cache
+
+
+def test_results_follow_the_tracked_version(monkeypatch):
+    version, calls = {"memory": 1}, []
+    monkeypatch.setitem(tool_cache._versions, "consult_memory", lambda user: version["memory"])
+
+    @tool_cache.cached
+    def consult_memory(query: str = "all"):
+        calls.append(query)
+        return f"facts v{version['memory']}"
+
+    assert consult_memory("all") == "facts v1"
+    assert consult_memory("all") == "facts v1"
+    assert len(calls) == 1
+
+    # Another worker saved a fact: this process's invalidate() never ran.
+    version["memory"] = 2
+    assert consult_memory("all") == "facts v2"
+    assert len(calls) == 2
+
+
+def test_unreadable_version_skips_the_cache(monkeypatch):
+    def broken(user):
+        raise RuntimeError("database down")
+    monkeypatch.setitem(tool_cache._versions, "consult_memory", broken)
+    calls = []
+
+    @tool_cache.cached
+    def consult_memory(query: str = "all"):
+        calls.append(query)
+        return "facts"
+
+    consult_memory("everything")
+    consult_memory("everything")
+    assert len(calls) == 2
@@ -0,0 +1,53 @@
+import time
+import asyncio
+
+from langchain_core.messages import AIMessage
+from langgraph.graph import StateGraph, MessagesState, START, END
+from langgraph.prebuilt import ToolNode
+
+import agent
+
+
+def _step(delays, log):
+    """A one-node graph running the agent's ordering wrappers over fake tools that sleep and log."""
+    def make(name, delay):
+        def tool(label: str) -> str:
+            """Fake tool."""
+            time.sleep(delay)
+            log.append(label)
+            return "ok"
+        tool.__name__ = name
+        return agent.as_async_tool(tool)
+
+    node = ToolNode([make(name, delay) for name, delay in delays.items()],
+                    wrap_tool_call=agent._sequence_tool_call, awrap_tool_call=agent._asequence_tool_call)
+    graph = StateGraph(MessagesState)
+    graph.add_node("tools", node)
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", END)
+    return graph.compile()
+
+
+# The first side effect is the slowest, so arrival order alone would put it last.
+DELAYS = {"send_email": 0.2, "delete_event": 0.0, "list_events": 0.05}
+CALLS = [
+    {"name": "send_email", "args": {"label": "send 1"}, "id": "a", "type": "tool_call"},
+    {"name": "list_events", "args": {"label": "read"}, "id": "b", "type": "tool_call"},
+    {"name": "delete_event", "args": {"label": "delete"}, "id": "c", "type": "tool_call"},
+    {"name": "send_email", "args": {"label": "send 2"}, "id": "d", "type": "tool_call"},
+]
+STATE = {"messages": [AIMessage(content="", tool_calls=CALLS)]}
+
+
+def test_sync_step_runs_side_effects_in_listed_order():
+    log = []
+    _step(DELAYS, log).invoke(STATE)
+    assert [label for label in log if label != "read"] == ["send 1", "delete", "send 2"]
+    assert agent._side_effects_done == {}
+
+
+def test_async_step_runs_side_effects_in_listed_order_and_reads_alongside():
+    log = []
+    asyncio.run(_step(DELAYS, log).ainvoke(STATE))
+    assert log == ["read", "send 1", "delete", "send 2"]
+    assert agent._side_effects_done == {}
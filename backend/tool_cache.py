@@ -0,0 +1,127 @@
+import os
+import time
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from sessions import current_user
+
+
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "512"))
+# Seconds a read-only tool result may be reused for the same arguments.
+TOOL_CACHE_TTLS = {
+    "list_events": float(os.getenv("TOOL_CACHE_TTL_LIST_EVENTS", "30")),
+    "consult_memory": float(os.getenv("TOOL_CACHE_TTL_CONSULT_MEMORY", "120")),
+    "read_emails": float(os.getenv("TOOL_CACHE_TTL_READ_EMAILS", "30")),
+}
+# Write tools and the cached read tools whose results they make stale. All of
+# the underlying data (memory, calendar, mailbox) is per session, so a write
+# only invalidates the writing session's entries.
+INVALIDATES = {
+    "schedule_event": ("list_events",),
+    "delete_event": ("list_events",),
+    "save_to_memory": ("consult_memory",),
+    "clear_memory": ("consult_memory",),
+    "send_email": ("read_emails",),
+}
+
+_lock = threading.Lock()
+# (user, tool, args) -> (expires_at, version, result)
+_entries = OrderedDict()
+_stats = {}
+# tool -> version_of(user) for read tools whose data other workers can change
+_versions = {}
+
+
+def _count(tool, field):
+    counters = _stats.setdefault(tool, {"hits": 0, "misses": 0, "invalidations": 0})
+    counters[field] += 1
+
+
+def track_version(tool, version_of):
+    """
+    Makes cached results of `tool` valid only while version_of(user) returns
+    what it did when they were stored. invalidate() only reaches this
+    process; a version read from the shared store also sees other workers' writes.
+    """
+    _versions[tool] = version_of
+
+
+def _get(key, version):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry[0] < time.monotonic() or entry[1] != version:
+            _entries.pop(key, None)
+            _count(key[1], "misses")
+            return None
+        _entries.move_to_end(key)
+        _count(key[1], "hits")
+        return entry
+
+
+def _put(key, version, result, ttl):
+    with _lock:
+        _entries[key] = (time.monotonic() + ttl, version, result)
+        _entries.move_to_end(key)
+        while len(_entries) > TOOL_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def invalidate(user, tools):
+    """Drops the user's (or, with user=None, everyone's) cached results for the given tools."""
+    with _lock:
+        stale = [key for key in _entries if user in (None, key[0]) and key[1] in tools]
+        for key in stale:
+            del _entries[key]
+            _count(key[1], "invalidations")
+
+
+def cached(func):
+    """
+    Memoizes a read-only tool per (session, tool, arguments) for its TTL, or
+    invalidates the affected read tools after a write tool runs. Other
+    functions are returned unchanged.
+    """
+    name = func.__name__
+    if name not in TOOL_CACHE_TTLS and name not in INVALIDATES:
+        return func
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        user = current_user()
+        if name in INVALIDATES:
+            try:
+                return func(*args, **kwargs)
+            finally:
+                invalidate(user, INVALIDATES[name])
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (user, name, tuple(sorted(bound.arguments.items())))
+        # Read before the call: a write landing in between leaves the entry stale, not wrong.
+        try:
+            version = _versions[name](user) if name in _versions else None
+        except Exception as e:
+            print(f"Tool cache version error for {name}: {e}")
+            return func(*args, **kwargs)
+        entry = _get(key, version)
+        if entry is not None:
+            return entry[2]
+        result = func(*args, **kwargs)
+        # Errors (login required, network failures) are worth retrying.
+        if not str(result).startswith("Error"):
+            _put(key, version, result, TOOL_CACHE_TTLS[name])
+        return result
+
+    return wrapper
+
+
+def cache_stats():
+    """Hit/miss/invalidation counters per tool plus the current entry count."""
+    with _lock:
+        tools = {tool: dict(counters) for tool, counters in _stats.items()}
+        for counters in tools.values():
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_rate"] = round(counters["hits"] / lookups, 3) if lookups else 0.0
+        return {"entries": len(_entries), "tools": tools}
@@ -184,7 +184,7 @@ function ChatInterface({ onLogout }: { onLogout: () => void }) {
 
   const fetchNextEvent = async () => {
     try {
-      const res = await fetch(`${BACKEND_URL}/next-event`);
+      const res = await fetch(`${BACKEND_URL}/next-event`, { credentials: "include" });
       if (res.ok) {
         const data = await res.json();
         setEvents(data);
@@ -194,9 +194,12 @@ function ChatInterface({ onLogout }: { onLogout: () => void }) {
     }
   };
 
-  // Initial load
+  // Initial load, then live updates pushed by the backend when the calendar changes
   useEffect(() => {
     fetchNextEvent();
+    const source = new EventSource(`${BACKEND_URL}/next-event/stream`, { withCredentials: true });
+    source.addEventListener("events", (e) => setEvents(JSON.parse((e as MessageEvent).data)));
+    return () => source.close();
   }, []);
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
@@ -219,6 +222,7 @@ function ChatInterface({ onLogout }: { onLogout: () => void }) {
       const token = localStorage.getItem("token");
       const res = await fetch(`${BACKEND_URL}/chat`, {
         method: "POST",
+        credentials: "include",
         headers: {
           "Content-Type": "application/json",
           "Authorization": `Bearer ${token}`